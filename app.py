@@ -1,11 +1,8 @@
-import json
-import os
 import random
-import shutil
 
-import requests
 import streamlit as st
-from packaging.version import Version
+
+from utils.poem_utils import get_daily_sentence
 
 
 st.set_page_config(page_title="数据分析工具", layout="wide")
@@ -31,22 +28,10 @@ def display_user_count():
     st.session_state.user_count = max(1, st.session_state.user_count)
 
 
-# 每日诗词
-def fetch_daily_sentence():
-    url = 'https://v1.jinrishici.com/all.json'
-    # url = 'https://v1.hitokoto.cn/?c=i'
-    try:
-        response = requests.get(url)
-        data = response.json()
-        return f"「{data['content']}」 —— {data['author']}"
-    except requests.exceptions.RequestException:
-        # 如果请求失败，返回固定的诗词
-        return "「月落乌啼霜满天，江枫渔火对愁眠」"
-
 # 显示每日诗词
 def display_daily_sentence():
     st.subheader("📖 每日诗词")
-    sici = fetch_daily_sentence()
+    sici = get_daily_sentence() # 后台按天刷新, 不等待网络请求
     st.info(sici)
 
 def main():
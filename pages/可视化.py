@@ -1,18 +1,23 @@
 from datetime import datetime, time
-from io import BytesIO
+from zipfile import ZIP_STORED, ZipFile
 
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
 import streamlit as st
 
 from utils.common_utils import *
+from utils.datetime_utils import parse_datetime
+from utils.filter_utils import apply_filters, column_mask, combine_masks
+from utils.flow_utils import flow_chart_tasks, guess_columns
+from utils.group_utils import GroupIndex
+from utils.lazy_utils import lazy_import
+from utils.perf_utils import begin_run, instrument, timed
+from utils.plot_utils import render_charts
+from utils.stats_utils import aggregate
 
-plt.rcParams['font.sans-serif']=['SimHei'] # 用黑体显示中文
-plt.rcParams['axes.unicode_minus']=False # 正常显示负号
+pd = lazy_import("pandas")
 
 
 def main():
+    begin_run()
     st.sidebar.title("可视化")
     pages = {
         "批量看流速分布": flow_display,
@@ -27,49 +32,142 @@ def main():
     else:
         st.title(page)
         st.info("该功能正在开发中...")
+    perf_panel()
 
-def convert_to_datetime(df, column):
+@instrument("转换时间列")
+def convert_to_datetime(df, column, date_format=None):
+    # 未指定格式时从样本推断格式, 整列按格式一次解析, 只有格式不一致的少数值才逐个解析
     try:
-        df[column] = pd.to_datetime(df[column])
-        return df, True
-    except:
-        return df, False
+        parsed, info = parse_datetime(df[column], date_format)
+    except Exception:
+        return df, False, {"format": date_format, "fallback_rows": 0, "failed_rows": len(df)}
+    if info["failed_rows"]:
+        return df, False, info
+    df = df.copy(deep=False) # 浅拷贝, 只替换该列, 不修改原数据
+    df[column] = parsed
+    return df, True, info
+
+# 以下缓存返回的是共享对象, 调用方只读不改
+@st.cache_resource(max_entries=8)
+def get_base_frame(_df, dataset_key, column, date_format=None): # 分组列转换后的基础数据, 每个数据集只在换分组列或格式时重新解析
+    return convert_to_datetime(_df, column, date_format)
+
+@st.cache_resource(max_entries=64)
+def stage_mask(_series, base_key, kind, column, lower, upper): # 每个筛选阶段只在自身参数变化时重新计算
+    with timed(f"筛选掩码({column})", rows=len(_series)):
+        return column_mask(_series, kind, lower, upper)
+
+@st.cache_resource(max_entries=8)
+@instrument("应用筛选")
+def filtered_frame(_df, _masks, _nan_masks, filter_key): # 所有筛选参数不变时直接复用筛选结果
+    return apply_filters(_df, combine_masks(_masks, len(_df)), _nan_masks)
+
+@st.cache_resource(max_entries=8)
+@instrument("构建分组索引")
+def group_index(_df, filter_key, group_column, columns): # 每份筛选结果只排序分组一次, 改图表样式不重建
+    return GroupIndex(_df, group_column, columns)
+
+@st.cache_resource(max_entries=16)
+@instrument("统计汇总")
+def flow_stats(_df, filter_key, value_columns, by, quantiles): # 同一筛选结果和统计参数只计算一次
+    return aggregate(_df, value_columns, by, quantiles)
+
+def clear_frame_caches(removed):
+    # 以上缓存的结果与数据集仓库中的DataFrame共享内存; 仓库淘汰或清除数据集时一并清空, 内存才能真正释放
+    # cache_resource不能按key删除, 只能整体清空, 其他数据集的派生结果下次用到时重新计算
+    for cached in (get_base_frame, stage_mask, filtered_frame, group_index, flow_stats):
+        cached.clear()
+
+dataset_store.on_remove("可视化", clear_frame_caches)
+
+def flow_statistics(df, filter_key, group_column, x_column, value_columns, water_column=None):
+    # 统计模式: 按时间/起点距分箱/水位分带分组, 向量化计算各列的有效数、均值、标准差、极值和分位数
+    st.subheader("统计汇总")
+    if not value_columns:
+        st.error("请先选择要统计的列(Y轴列)")
+        return
+    # 只统计数值列, 文本列和分类列没有均值/分位数
+    skipped = [column for column in value_columns if not pd.api.types.is_numeric_dtype(df[column])]
+    if skipped:
+        st.warning(f"以下列不是数值列, 不参与统计: {', '.join(map(str, skipped))}")
+        value_columns = [column for column in value_columns if column not in skipped]
+        if not value_columns:
+            return
+
+    by = []
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.checkbox(f"按 {group_column} 分组", value=False):
+            by.append((group_column, 'value', None))
+    with col2:
+        if pd.api.types.is_numeric_dtype(df[x_column]): # 分箱和分带只适用于数值列
+            x_width = st.number_input(f"{x_column} 分箱宽度 (0为不分箱)", min_value=0.0, value=0.0, step=1.0)
+            if x_width > 0:
+                by.append((x_column, 'width', x_width))
+    with col3:
+        if water_column and pd.api.types.is_numeric_dtype(df[water_column]):
+            water_bands = st.number_input("水位等频分带数 (0为不分带)", min_value=0, max_value=50, value=0, step=1)
+            if water_bands:
+                by.append((water_column, 'quantile', water_bands))
+    quantiles = st.multiselect("分位数(%)", [5, 10, 25, 50, 75, 90, 95], default=[10, 50, 90])
+
+    stats = flow_stats(df, filter_key, tuple(value_columns), tuple(by), tuple(sorted(quantiles)))
+    st.write(f"共 {len(stats)} 组, 统计 {len(df)} 行")
+    st.dataframe(stats, use_container_width=True, hide_index=True)
+    if len(by) == 1 and by[0][1] == 'width' and len(stats): # 只按起点距分箱时画出各列均值沿起点距的分布
+        st.line_chart(stats.set_index(stats.columns[0])[[f"{column} 均值" for column in value_columns]])
+    save_and_download_file(stats, "流速统计.xlsx")
 
 def flow_display():
     st.title("批量看流速分布")
     uploaded_file = st.file_uploader("上传文件", type=["csv", "xlsx", "xls"])
 
     if uploaded_file:
-        df = read_excel_file(uploaded_file)
+        # 数据集按文件内容标识, 不同会话上传同一文件共享同一份只读数据和筛选缓存
+        # 紧凑加载: 浮点转float32, 重复文本转分类, 缓存的数据集和后续筛选结果占用的内存更少
+        compact = st.checkbox("紧凑加载(浮点数降为单精度、重复文本转为分类, 节省内存)", value=False)
+        dataset_key = upload_key(uploaded_file, compact=compact)
+        df = read_excel_file(uploaded_file, compact=compact)
         
         if df is not None:
-            time_columns = [col for col in df.columns if '时间' in col or '视频开始时间' in col]
-            X_columns = [col for col in df.columns if '起点距' in col or '序号' in col]
-            water_columns = [col for col in df.columns if '水位' in col]
+            if compact:
+                st.caption(compact_summary(df))
+            guessed = guess_columns(df.columns)
             
-            default_index = df.columns.get_loc(time_columns[0]) if time_columns else 0
+            default_index = df.columns.get_loc(guessed['group']) if guessed['group'] else 0
             group_column = st.selectbox('选择分组列(一般为时间):', df.columns, index=default_index)
 
-            df, conversion_success = convert_to_datetime(df, group_column)
+            raw_df = df
+            date_format = None
+            df, conversion_success, parse_info = get_base_frame(raw_df, dataset_key, group_column)
             
             if not conversion_success:
-                st.warning(f"无法自动将'{group_column}'列转换为日期时间格式。请指定日期时间格式。")
-                date_format = st.text_input("请输入日期时间格式 (例如: %Y-%m-%d %H:%M:%S)", "%Y-%m-%d %H:%M:%S")
-                try:
-                    df[group_column] = pd.to_datetime(df[group_column], format=date_format)
-                    conversion_success = True
-                except:
-                    st.error("无法使用提供的格式转换日期时间。请检查格式是否正确。")
-
-            X_column = st.selectbox('选择X轴列:', df.columns, index=df.columns.get_loc(X_columns[0]) if X_columns else 0)
+                st.warning(f"无法自动将'{group_column}'列转换为日期时间格式({parse_info['failed_rows']} 行无法识别)。请指定日期时间格式。")
+                # 默认填入从样本推断出的格式
+                date_format = st.text_input("请输入日期时间格式 (例如: %Y-%m-%d %H:%M:%S)", parse_info["format"] or "%Y-%m-%d %H:%M:%S")
+                df, conversion_success, parse_info = get_base_frame(raw_df, dataset_key, group_column, date_format)
+                if not conversion_success:
+                    st.error(f"无法使用提供的格式转换日期时间({parse_info['failed_rows']} 行无法识别)。请检查格式是否正确。")
+            if conversion_success and parse_info["fallback_rows"]:
+                st.caption(f"'{group_column}'列按格式 {parse_info['format']} 解析, 其中 {parse_info['fallback_rows']} 行格式不一致, 已逐个解析")
+            base_key = (dataset_key, group_column, date_format)
+
+            X_column = st.selectbox('选择X轴列:', df.columns, index=df.columns.get_loc(guessed['x']) if guessed['x'] else 0)
             selected_columns = st.multiselect('选择要绘制的列(Y轴列, 可多选):', df.columns)
             line_columns = st.multiselect('选择要绘制折线的列:', selected_columns)
             
             # 修改水位列选择逻辑
-            water_column = st.selectbox('选择水位列 (可选):', [''] + list(df.columns), index=df.columns.get_loc(water_columns[0])+1 if water_columns else 0)
+            water_column = st.selectbox('选择水位列 (可选):', [''] + list(df.columns), index=df.columns.get_loc(guessed['water'])+1 if guessed['water'] else 0)
             use_water_column = water_column != ''
             
-            df_filtered = df.copy()
+            # 各阶段只产生布尔掩码, 最后统一筛选一次
+            masks = []
+            nan_masks = []
+            filter_key = []
+
+            def add_mask(column, kind, lower, upper):
+                masks.append(stage_mask(df[column], base_key, kind, column, lower, upper))
+                filter_key.append((column, kind, lower, upper))
 
             # 时间范围筛选
             use_time_filter = st.checkbox("启用时间范围筛选", value=False)
@@ -93,21 +191,10 @@ def flow_display():
 
                 if time_filter_mode == "按日期筛选":
                     # 日期筛选，比较日期和时间
-                    df_filtered = df_filtered[(df_filtered[group_column] >= start_datetime) & 
-                                            (df_filtered[group_column] <= end_datetime)]
+                    add_mask(group_column, 'range', start_datetime, end_datetime)
                 else:
-                    # 时间筛选，处理跨午夜的情况
-                    mask = []
-                    for dt in df_filtered[group_column]:
-                        dt_time = dt.time()
-                        if start_time <= end_time:
-                            # 正常情况：开始时间小于结束时间
-                            mask.append(start_time <= dt_time <= end_time)
-                        else:
-                            # 跨午夜情况
-                            mask.append(start_time <= dt_time or dt_time <= end_time)
-                    
-                    df_filtered = df_filtered[mask]
+                    # 时间筛选，处理跨午夜的情况, 整列向量化计算
+                    add_mask(group_column, 'time_of_day', start_time, end_time)
 
             # 水位范围筛选
             use_water_filter = st.checkbox("启用水位范围筛选", value=False)
@@ -117,7 +204,7 @@ def flow_display():
                     min_water_value = st.number_input("最小水位", value=float(df[water_column].min()), step=0.01)
                 with max_water:
                     max_water_value = st.number_input("最大水位", value=float(df[water_column].max()), step=0.01)
-                df_filtered = df_filtered[(df_filtered[water_column] >= min_water_value) & (df_filtered[water_column] <= max_water_value)]
+                add_mask(water_column, 'range', min_water_value, max_water_value)
 
             # 置信度流向夹角范围筛选
             use_confidence_angle_filter = st.checkbox("启用置信度流向夹角筛选", value=False)
@@ -135,11 +222,12 @@ def flow_display():
                         max_confidence_value = st.number_input("最大置信度", value=1.0, min_value=0.0, max_value=1.0, step=0.01)
                     
                     for speed_col, conf_col in zip(selected_columns, confidence_columns): # zip函数用于同时遍历两个列表，一一对应，很妙
-                        mask = (df_filtered[conf_col] < min_confidence_value) | (df_filtered[conf_col] > max_confidence_value)
-                        df_filtered.loc[mask, speed_col] = np.nan # 将不满足条件的值赋值为None比较好
+                        # 置信度不在范围内的流速值置为NaN, 行保留
+                        mask = stage_mask(df[conf_col], base_key, 'outside', conf_col, min_confidence_value, max_confidence_value)
+                        nan_masks.append((speed_col, mask))
+                        filter_key.append((speed_col, conf_col, 'outside', min_confidence_value, max_confidence_value))
 
-                angle_columns = [col for col in df.columns if '流向夹角' in col]
-                angle_column = st.selectbox("选择流向夹角列:", [''] + list(df.columns), index=df.columns.get_loc(angle_columns[0])+1 if angle_columns else 0)
+                angle_column = st.selectbox("选择流向夹角列:", [''] + list(df.columns), index=df.columns.get_loc(guessed['angle'])+1 if guessed['angle'] else 0)
                 
                 if angle_column:
                     min_angle, max_angle = st.columns(2)
@@ -147,10 +235,26 @@ def flow_display():
                         min_angle_value = st.number_input("最小流向夹角", value=-180.00, step=0.1)
                     with max_angle:
                         max_angle_value = st.number_input("最大流向夹角", value=180.00, step=0.1)
-                    df_filtered = df_filtered[(df_filtered[angle_column] >= min_angle_value) & (df_filtered[angle_column] <= max_angle_value)]
+                    add_mask(angle_column, 'range', min_angle_value, max_angle_value)
+
+            filter_state = (base_key, tuple(filter_key))
+            df_filtered = filtered_frame(df, masks, nan_masks, filter_state)
 
             st.subheader("筛选后的数据预览")
-            st.dataframe(df_filtered)
+            # 分页预览, 只把当前页发送到浏览器
+            total_rows = len(df_filtered)
+            col1, col2 = st.columns(2)
+            with col1:
+                page_size = st.number_input("每页行数", min_value=100, max_value=100000, value=1000, step=100)
+            page_count = max((total_rows - 1) // page_size + 1, 1)
+            with col2:
+                page = st.number_input(f"页码 (共 {page_count} 页, {total_rows} 行)", min_value=1, max_value=page_count, value=1, step=1)
+            st.dataframe(df_filtered.iloc[(page - 1) * page_size:page * page_size])
+
+            output_mode = st.radio("输出方式", ("分组绘图", "统计汇总"), horizontal=True)
+            if output_mode == "统计汇总":
+                flow_statistics(df_filtered, filter_state, group_column, X_column, selected_columns, water_column if use_water_column else None)
+                return
 
             # 图表布局设置
             col1, col2, col3, col4, col5 = st.columns(5)
@@ -164,6 +268,8 @@ def flow_display():
                 graph_mark = st.checkbox("是否显示图例", value=True)
             with col5:
                 graph_grid = st.checkbox("是否显示网格", value=True)
+            # 每条序列的显示点数上限, 折线用LTTB、散点用网格分箱抽稀; 导出的数据不受影响
+            max_points = st.number_input("每条序列最多显示点数 (0为不抽稀)", min_value=0, max_value=1000000, value=0, step=500)
 
             st.subheader("自定义坐标轴范围")
             col1, col2 = st.columns(2)
@@ -183,47 +289,34 @@ def flow_display():
                 if not selected_columns:
                     st.error("请先选择要绘制的列")
                 else:
-                    image_buffers = []
-                    grouped = df_filtered.groupby(group_column)
+                    # 各组数据直接从排序后的连续数组切片, 不为每个时刻构造子DataFrame
+                    index_columns = [X_column] + selected_columns + ([water_column] if use_water_column else [])
+                    index = group_index(df_filtered, filter_state, group_column, tuple(dict.fromkeys(index_columns)))
                     cols = st.columns(charts_per_row)
-                    
-                    for i, (name, group) in enumerate(grouped):
-                        fig, ax = plt.subplots(figsize=(fig_width, fig_height))
-                        
-                        for column in selected_columns:
-                            if column in line_columns:
-                                ax.plot(group[X_column].values, group[column].values, label=column)
-                            else:
-                                ax.scatter(group[X_column].values, group[column].values, label=column)
-                        
-                        # 根据是否选择水位列来设置标题
-                        if use_water_column:
-                            ax.set_title(f"时间: {name} 水位: {(group[water_column].values[0]):.2f}m")
-                        else:
-                            ax.set_title(f"时间: {name}")
-                        
-                        ax.set_xlabel(X_column)
-                        ax.set_ylabel("流速")
-                        
-                        if use_custom_x:
-                            ax.set_xlim(x_min, x_max)
-                        if use_custom_y:
-                            ax.set_ylim(y_min, y_max)
-                        
-                        if graph_mark:
-                            ax.legend()
-                        if graph_grid:
-                            ax.grid(True)
-                        
-                        cols[i % charts_per_row].pyplot(fig)
-                        plt.close(fig)
-
-                        img_buffer = BytesIO()
-                        fig.savefig(img_buffer, format='png')
-                        img_buffer.seek(0)
-                        image_buffers.append(img_buffer)
-
-                    save_and_download_images(image_buffers)
+                    # 先按网格位置占位, 子进程绘制完成一张就填一张
+                    slots = [cols[i % charts_per_row].empty() for i in range(len(index))]
+                    # 绘图任务与命令行批量导出(scripts/export_charts.py)共用, 标题中的水位为每组第一个值
+                    tasks = flow_chart_tasks(index, X_column, selected_columns, line_columns, water_column if use_water_column else None, max_points)
+
+                    options = {
+                        'figsize': (fig_width, fig_height),
+                        'x_label': X_column,
+                        'x_lim': (x_min, x_max) if use_custom_x else None,
+                        'y_lim': (y_min, y_max) if use_custom_y else None,
+                        'legend': graph_mark,
+                        'grid': graph_grid,
+                    }
+                    # 每张图完成后直接写入zip临时文件(超过阈值自动转存磁盘), 不保留单独的图片缓冲区;
+                    # png本身已压缩, 用ZIP_STORED只存储不压缩
+                    archive = spooled_output()
+                    with timed("绘图", rows=len(df_filtered)) as entry:
+                        with ZipFile(archive, "w", ZIP_STORED) as zip_file:
+                            for i, png in render_charts(tasks, options):
+                                slots[i].image(png, use_column_width=True)
+                                zip_file.writestr(f"figure_{i}.png", png)
+                        entry["bytes_out"] = archive.tell() # zip关闭后才写入中央目录, 此时才是完整大小
+
+                    save_and_download_images(archive if len(index) else None)
 
 
 if __name__ == '__main__':
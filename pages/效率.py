@@ -1,15 +1,26 @@
 import os
+import time
 
-import pandas as pd
 import streamlit as st
 
 from utils.common_utils import *
+from utils.convert_utils import convert_csv_files, excel_path_for, is_up_to_date
+from utils.export_utils import spooled_output, union_columns
+from utils.lazy_utils import lazy_import
+from utils.merge_utils import EXCEL_EXTENSIONS, merge_files
+from utils.perf_utils import begin_run, timed
+from utils.scan_utils import preflight, scan_folder
+from utils.sheet_utils import read_sheet_names, read_sheets, split_sheets
+
+pd = lazy_import("pandas")
 
 
 def main():
+    begin_run()
     st.sidebar.title("效率")
     pages = {
         "Excel处理": excel_processing_page,
+        "数据集缓存": dataset_store_page,
         "XX处理": None,
 
     }
@@ -22,6 +33,37 @@ def main():
     else:
         st.title(page)
         st.info("该功能正在开发中...")
+    perf_panel()
+
+def dataset_store_page():
+    st.title("数据集缓存")
+    st.write("所有会话共享的已加载数据集, 超出内存预算时自动淘汰最久未使用且没有会话在用的数据集")
+
+    stats = dataset_store.stats()
+    used_mb = dataset_store.nbytes / 1024 / 1024
+    budget_mb = dataset_store.max_bytes / 1024 / 1024
+    col1, col2, col3 = st.columns(3)
+    col1.metric("数据集数量", len(stats))
+    col2.metric("占用内存(MB)", f"{used_mb:.1f}")
+    col3.metric("内存预算(MB)", f"{budget_mb:.0f}")
+    st.progress(min(used_mb / budget_mb, 1.0) if budget_mb else 0.0)
+
+    if not stats:
+        st.info("当前没有已加载的数据集")
+        return
+    st.dataframe(pd.DataFrame(stats).drop(columns="key"), use_container_width=True)
+
+    labels = [f"{i + 1}. {entry['数据集']}" for i, entry in enumerate(stats)]
+    selected = st.selectbox("选择要清除的数据集", labels)
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("清除所选数据集"):
+            dataset_store.invalidate(key=stats[labels.index(selected)]["key"])
+            st.rerun()
+    with col2:
+        if st.button("清除全部"):
+            dataset_store.invalidate()
+            st.rerun()
 
 def excel_processing_page():
     st.title("Excel处理")
@@ -45,45 +87,81 @@ def merge_folder_excel():
     folder_path = st.text_input("请输入文件夹路径：")
     folder_path = trim_quotes(folder_path)
     if folder_path:
+        entries = scan_entries(folder_path, EXCEL_EXTENSIONS)
+        if entries is None:
+            return
+        if not entries:
+            st.warning("文件夹中没有可合并的Excel/CSV文件")
+            return
+        # 输入路径后立即预检: 只读各文件表头和前几行, 合并前就能看到表头是否一致
+        summary, headers = folder_preflight(entries)
+        show_preflight(summary)
+        valid_headers = [(file_path, header) for (file_path, _, _), header in zip(entries, headers) if header]
+        header_mismatch = len({header for _, header in valid_headers}) > 1
+        if header_mismatch:
+            st.warning("警告：上传的文件表头不一致，强行合并的话也不是不行🤭。勾选“表头不一致时我就要合并”后再点击合并。")
+
+        force_merge = st.checkbox("表头不一致时我就要合并", value=False)
         if st.button("合并文件"):
-            dfs = []
-            headers = set()
-            
-            for file in os.listdir(folder_path):
-                if file.endswith(('.xlsx', '.xls', '.csv')):
-                    filepath = os.path.join(folder_path, file)
-                    df = read_excel_filepath(filepath)
-                    if df is not None:
-                        headers.add(tuple(df.columns))
-                        dfs.append(df)
-            
-            if len(headers) > 1:
-                st.warning("警告：上传的文件表头不一致，强行合并的话也不是不行🤭。")
-                if st.button("我就要合并"):
-                    merged_df = pd.concat(dfs, ignore_index=True)
-                    save_and_download_file(merged_df)
+            if not valid_headers:
+                st.warning("文件夹中没有可合并的Excel/CSV文件")
+            elif header_mismatch and not force_merge:
+                st.warning("警告：上传的文件表头不一致，强行合并的话也不是不行🤭。勾选“表头不一致时我就要合并”后再点击合并。")
             else:
-                merged_df = pd.concat(dfs, ignore_index=True)
-                save_and_download_file(merged_df)
+                output = spooled_output()
+                with st.spinner(f"正在合并 {len(valid_headers)} 个文件..."), timed("合并文件") as entry:
+                    rows = merge_files(
+                        [file_path for file_path, _ in valid_headers],
+                        output,
+                        columns=union_columns(header for _, header in valid_headers),
+                        on_error=lambda file_path, error: st.error(f"{os.path.basename(file_path)} 读取失败: {error}"),
+                    )
+                    entry["rows"] = rows
+                    entry["bytes_in"] = sum(os.path.getsize(file_path) for file_path, _ in valid_headers)
+                    entry["bytes_out"] = output.tell()
+                st.write(f"共合并 {rows} 行")
+                download_excel_file(output)
     else:
         st.info("请选择文件夹路径")
 
+def scan_entries(folder_path, extensions): # 只取目录项元数据, 每次重跑都重新扫描以发现文件变化
+    try:
+        return scan_folder(folder_path, extensions)
+    except OSError as e:
+        st.error(f"无法读取文件夹: {e}")
+        return None
+
+@st.cache_data(show_spinner="正在预读各文件表头...")
+def folder_preflight(entries): # 文件名/大小/修改时间都不变时不重复预读
+    return preflight(entries)
+
+def show_preflight(summary, status=None):
+    table = pd.DataFrame(summary)
+    if status is not None:
+        table.insert(1, "状态", status)
+    failed = int((table["错误"] != "").sum())
+    groups = table.loc[table["表头组"] > 0, "表头组"].nunique()
+    st.write(f"共 {len(table)} 个文件, {table['大小(KB)'].sum() / 1024:.1f} MB, {groups} 种表头" + (f", {failed} 个预读失败" if failed else ""))
+    st.dataframe(table, use_container_width=True, hide_index=True)
+
+@st.cache_data
+def get_sheet_names(file_path, mtime_ns, size): # 文件不变时重跑不再打开工作簿
+    return read_sheet_names(file_path)
+
 def split_excel_sheets():
     st.subheader("拆分Excel的多个sheets")
     uploaded_file = st.text_input("请输入文件路径：")
     uploaded_file = trim_quotes(uploaded_file)
 
     if uploaded_file:
-        excel = pd.ExcelFile(uploaded_file)
-        sheet_names = excel.sheet_names
+        _, mtime_ns, size = file_fingerprint(uploaded_file)
+        sheet_names = get_sheet_names(uploaded_file, mtime_ns, size)
         
         dir_path = os.path.dirname(uploaded_file) # 获取文件所在目录
         
         if st.button("拆分工作表"):
-            for sheet in sheet_names:
-                df = pd.read_excel(uploaded_file, sheet_name=sheet)
-                output_file = os.path.join(dir_path, f"{sheet}.xlsx")
-                df.to_excel(output_file, index=False)
+            # 每个进程只打开一次工作簿, 读取并写出自己负责的若干sheet
+            for sheet, output_file in split_sheets(uploaded_file, dir_path, sheet_names):
                 st.write(f"Sheet '{sheet}' 已保存至 '{output_file}'")
 
             st.success("已拆分所有工作表")
@@ -94,16 +172,12 @@ def merge_excel_sheets():
     uploaded_file = trim_quotes(uploaded_file)
     
     if uploaded_file:
-        excel = pd.ExcelFile(uploaded_file)
-        sheet_names = excel.sheet_names
+        _, mtime_ns, size = file_fingerprint(uploaded_file)
+        sheet_names = get_sheet_names(uploaded_file, mtime_ns, size)
         
         if st.button("合并工作表"):
-            dfs = []
-            for sheet in sheet_names:
-                df = pd.read_excel(uploaded_file, sheet_name=sheet)
-                dfs.append(df)
-            
-            merged_df = pd.concat(dfs, ignore_index=True)
+            sheets = read_sheets(uploaded_file, sheet_names)
+            merged_df = pd.concat(sheets.values(), ignore_index=True)
             save_and_download_file(merged_df)
             st.success("已合并所有工作表")
 
@@ -113,22 +187,36 @@ def csv_to_excel():
     folder_path = trim_quotes(folder_path)
 
     if folder_path:
-        csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
+        entries = scan_entries(folder_path, ('.csv',))
+        if entries is None:
+            return
         
-        if not csv_files:
+        if not entries:
             st.warning("指定文件夹中没有找到CSV文件")
         else:
-            st.write(f"找到 {len(csv_files)} 个CSV文件")
+            st.write(f"找到 {len(entries)} 个CSV文件")
+            csv_paths = [file_path for file_path, _, _ in entries]
+            summary, _ = folder_preflight(entries)
+            show_preflight(summary, ["已是最新" if is_up_to_date(path, excel_path_for(path)) else "待转换" for path in csv_paths])
             
+            force = st.checkbox("重新转换全部文件(不跳过已是最新的)", value=False)
             if st.button("转换为Excel"):
-                for csv_file in csv_files:
-                    file_path = os.path.join(folder_path, csv_file)
-                    df = read_excel_filepath(file_path)
-                    excel_file = csv_file.rsplit('.', 1)[0] + '.xlsx'
-                    excel_path = os.path.join(folder_path, excel_file)
-                    df.to_excel(excel_path, index=False)
-                
-                st.success(f"已将 {len(csv_files)} 个CSV文件转换为Excel文件")
+                progress = st.progress(0.0, text="开始转换...")
+                table = st.empty()
+                results = []
+                last_refresh = 0.0
+                # 多进程并行转换, 每完成一个文件更新进度, 状态表限频刷新避免文件很多时反复发送整表
+                with timed("CSV转Excel", bytes_in=sum(os.path.getsize(path) for path in csv_paths)) as entry:
+                    for result in convert_csv_files(csv_paths, force=force):
+                        results.append(result)
+                        progress.progress(len(results) / len(csv_paths), text=f"{len(results)}/{len(csv_paths)} {result['文件']}")
+                        if time.monotonic() - last_refresh > 1 or len(results) == len(csv_paths):
+                            table.dataframe(pd.DataFrame(results), use_container_width=True)
+                            last_refresh = time.monotonic()
+                    entry["rows"] = sum(result['行数'] or 0 for result in results)
+
+                status_counts = pd.Series([result['状态'] for result in results]).value_counts()
+                st.success("，".join(f"{status} {count} 个" for status, count in status_counts.items()))
                 st.info(f"转换后的Excel文件保存在: {folder_path}")
     else:
         st.info("请输入文件夹路径")
@@ -0,0 +1,348 @@
+"""离线基准测试: 生成与业务数据形状相近的合成数据, 在Streamlit之外对核心函数计时。
+
+用法:
+    python scripts/benchmark.py                          # 运行全部用例
+    python scripts/benchmark.py --only read filter       # 只运行名称包含关键字的用例
+    python scripts/benchmark.py --save-baseline baseline.json
+    python scripts/benchmark.py --baseline baseline.json --tolerance 0.2
+
+每个用例报告耗时(多次运行取最短)、吞吐量(行/秒, MB/秒)和峰值内存(tracemalloc, 不含子进程)。
+与基线对比时, 任一用例比基线慢超过容差即返回非零退出码。合成数据按参数缓存在数据目录中, 重复运行不再生成。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import time as dtime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_DIR = os.path.join(tempfile.gettempdir(), "streamlit_benchmark_data")
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def generate_flow_frame(rows, points_per_group=100, seed=0):
+    # 与测流数据形状一致: 每个时刻一组, 组内为各起点距的流速, 同组水位相同
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    groups = max(rows // points_per_group, 1)
+    rows = groups * points_per_group
+    group_ids = np.repeat(np.arange(groups), points_per_group)
+    times = pd.Timestamp("2024-06-01") + pd.to_timedelta(group_ids * 10, unit="m")
+    distance = np.tile(np.linspace(0, 200, points_per_group), groups).round(2)
+    water = (10 + np.sin(np.arange(groups) / 50) + rng.normal(0, 0.05, groups)).round(2)[group_ids]
+    profile = np.sin(np.pi * distance / 200)
+    return pd.DataFrame({
+        "时间": times.strftime(DATE_FORMAT),
+        "起点距": distance,
+        "水位": water,
+        "流速1": (profile * 1.5 + rng.normal(0, 0.1, rows)).round(3),
+        "流速2": (profile * 1.2 + rng.normal(0, 0.1, rows)).round(3),
+        "置信度1": rng.uniform(0, 1, rows).round(3),
+        "置信度2": rng.uniform(0, 1, rows).round(3),
+        "流向夹角": rng.uniform(-180, 180, rows).round(1),
+        "备注": np.where(rng.uniform(0, 1, rows) < 0.1, "岸边回流", "正常"),
+    })
+
+def generate_data(data_dir, rows, files, sheets):
+    # 返回各数据文件路径; 参数相同且已生成过时直接复用
+    import pandas as pd
+    from utils.export_utils import write_xlsx_stream
+    data_dir = os.path.join(data_dir, f"rows{rows}_files{files}_sheets{sheets}")
+    paths = {
+        "csv_utf8": os.path.join(data_dir, "flow_utf8.csv"),
+        "csv_gbk": os.path.join(data_dir, "flow_gbk.csv"),
+        "xlsx": os.path.join(data_dir, "flow.xlsx"),
+        "sheets": os.path.join(data_dir, "sheets.xlsx"),
+        "folder": os.path.join(data_dir, "folder"),
+    }
+    done_marker = os.path.join(data_dir, ".done")
+    if os.path.exists(done_marker):
+        return paths
+
+    print(f"生成合成数据: {data_dir}")
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.makedirs(paths["folder"])
+    df = generate_flow_frame(rows)
+    df.to_csv(paths["csv_utf8"], index=False, encoding="utf-8")
+    df.to_csv(paths["csv_gbk"], index=False, encoding="gbk")
+    write_xlsx_stream([df], df.columns, paths["xlsx"])
+
+    from openpyxl import Workbook
+    sheet_rows = max(rows // sheets, 1)
+    wb = Workbook(write_only=True)
+    for i in range(sheets):
+        ws = wb.create_sheet(f"Sheet{i + 1}")
+        part = generate_flow_frame(sheet_rows, seed=i + 1)
+        ws.append(list(part.columns))
+        for row in part.itertuples(index=False):
+            ws.append(list(row))
+    wb.save(paths["sheets"])
+
+    # 文件夹: 大部分为GBK/UTF-8的CSV, 每10个中有一个xlsx
+    file_rows = max(rows // files, 10)
+    for i in range(files):
+        part = generate_flow_frame(file_rows, points_per_group=10, seed=100 + i)
+        if i % 10 == 9:
+            write_xlsx_stream([part], part.columns, os.path.join(paths["folder"], f"part_{i:04d}.xlsx"))
+        else:
+            part.to_csv(os.path.join(paths["folder"], f"part_{i:04d}.csv"), index=False, encoding="gbk" if i % 2 else "utf-8")
+    open(done_marker, "w").close()
+    return paths
+
+
+def build_cases(paths, work_dir, plot_groups):
+    # 每个用例: (名称, 准备函数, 被计时函数); 被计时函数返回 (处理行数, 处理字节数)
+    import numpy as np
+    import pandas as pd
+    from utils.common_utils import read_csv_path, read_filepath, read_filepath_cached
+    from utils.convert_utils import convert_csv_files
+    from utils.datetime_utils import parse_datetime
+    from utils.dtype_utils import compact_frame
+    from utils.export_utils import spooled_output, write_xlsx_stream
+    from utils.filter_utils import apply_filters, column_mask, combine_masks
+    from utils.group_utils import GroupIndex
+    from utils.lod_utils import downsample_series
+    from utils.merge_utils import list_excel_files, merge_files
+    from utils.plot_utils import render_charts
+    from utils.sheet_utils import read_sheets, split_sheets
+    from utils.stats_utils import aggregate
+
+    size = os.path.getsize
+    state = {}
+
+    def frame():
+        if "df" not in state:
+            df = read_csv_path(paths["csv_utf8"])
+            df["时间"] = pd.to_datetime(df["时间"], format=DATE_FORMAT)
+            state["df"] = df
+        return state["df"]
+
+    def read_csv(key):
+        return lambda: (len(read_csv_path(paths[key])), size(paths[key]))
+
+    def read_xlsx():
+        return len(read_filepath(paths["xlsx"])), size(paths["xlsx"])
+
+    def read_cached_warm():
+        return len(read_filepath_cached(paths["xlsx"])), size(paths["xlsx"])
+
+    def to_datetime():
+        raw = read_csv_path(paths["csv_utf8"], usecols=["时间"])["时间"]
+        parse_datetime(raw)
+        return len(raw), 0
+
+    def compact():
+        df = read_csv_path(paths["csv_utf8"])
+        report = compact_frame(df).attrs["compact"]
+        return len(df), report["before"] - report["after"] # 字节数为节省的内存
+
+    def filters():
+        df = frame()
+        masks = [
+            column_mask(df["时间"], "time_of_day", dtime(22, 0), dtime(2, 0)),
+            column_mask(df["水位"], "range", 9.5, 10.5),
+            column_mask(df["流向夹角"], "range", -90.0, 90.0),
+        ]
+        nan_masks = [(speed, column_mask(df[conf], "outside", 0.2, 1.0)) for speed, conf in [("流速1", "置信度1"), ("流速2", "置信度2")]]
+        apply_filters(df, combine_masks(masks, len(df)), nan_masks)
+        return len(df), 0
+
+    def flow_stats():
+        df = frame()
+        aggregate(df, ["流速1", "流速2"], [("起点距", "width", 10.0), ("水位", "quantile", 4)], [10, 50, 90])
+        return len(df), 0
+
+    def group_plot():
+        df = frame()
+        index = GroupIndex(df, "时间", ["起点距", "流速1", "流速2", "水位"])
+        water_levels = index.first("水位")
+        count = min(plot_groups, len(index))
+        def tasks():
+            for i in range(count):
+                series = []
+                for column, is_line in [("流速1", False), ("流速2", True)]:
+                    x, y = downsample_series(index.values("起点距", i), index.values(column, i), 500, is_line)
+                    series.append((column, x, y, is_line))
+                yield f"时间: {index.keys[i]} 水位: {water_levels[i]:.2f}m", series
+        options = {"figsize": (6, 4), "x_label": "起点距", "x_lim": None, "y_lim": None, "legend": True, "grid": True}
+        rendered = sum(len(png) for _, png in render_charts(tasks(), options))
+        return int(index.offsets[count]), rendered
+
+    def group_index():
+        df = frame()
+        index = GroupIndex(df, "时间", ["起点距", "流速1", "流速2", "水位"])
+        index.first("水位")
+        index.reduce("流速1", np.fmax)
+        return len(df), 0
+
+    def merge_folder():
+        output = spooled_output()
+        file_paths = list_excel_files(paths["folder"])
+        rows = merge_files(file_paths, output)
+        output.close()
+        return rows, sum(size(path) for path in file_paths)
+
+    convert_dir = os.path.join(work_dir, "convert")
+    def setup_convert():
+        shutil.rmtree(convert_dir, ignore_errors=True)
+        os.makedirs(convert_dir)
+        for name in os.listdir(paths["folder"]):
+            if name.endswith(".csv"):
+                shutil.copy(os.path.join(paths["folder"], name), convert_dir)
+
+    def convert_folder():
+        csv_paths = [os.path.join(convert_dir, name) for name in os.listdir(convert_dir) if name.endswith(".csv")]
+        rows = sum(result["行数"] or 0 for result in convert_csv_files(csv_paths, force=True))
+        return rows, sum(size(path) for path in csv_paths)
+
+    def read_all_sheets():
+        return sum(len(df) for df in read_sheets(paths["sheets"]).values()), size(paths["sheets"])
+
+    split_dir = os.path.join(work_dir, "split")
+    def split_all_sheets():
+        shutil.rmtree(split_dir, ignore_errors=True)
+        os.makedirs(split_dir)
+        outputs = list(split_sheets(paths["sheets"], split_dir))
+        return 0, sum(size(output_file) for _, output_file in outputs)
+
+    def export_xlsx():
+        df = frame()
+        output = spooled_output()
+        write_xlsx_stream([df], df.columns, output)
+        written = output.tell()
+        output.close()
+        return len(df), written
+
+    def export_csv():
+        df = frame()
+        return len(df), len(df.to_csv(index=False).encode("utf-8"))
+
+    def warm_cache():
+        read_filepath_cached(paths["xlsx"])
+
+    return [
+        ("read_csv_utf8", None, read_csv("csv_utf8")),
+        ("read_csv_gbk", None, read_csv("csv_gbk")),
+        ("read_xlsx", None, read_xlsx),
+        ("read_cached_warm", warm_cache, read_cached_warm),
+        ("to_datetime", None, to_datetime),
+        ("compact_dtypes", None, compact),
+        ("filter_chain", frame, filters),
+        ("group_index", frame, group_index),
+        ("group_plot", frame, group_plot),
+        ("flow_stats", frame, flow_stats),
+        ("merge_folder", None, merge_folder),
+        ("convert_folder", setup_convert, convert_folder),
+        ("read_sheets", None, read_all_sheets),
+        ("split_sheets", None, split_all_sheets),
+        ("export_xlsx", frame, export_xlsx),
+        ("export_csv", frame, export_csv),
+    ]
+
+def run_case(setup, func, repeat):
+    # 第一次运行在tracemalloc下统计峰值内存(同时作为预热), 之后repeat次计时取最短
+    if setup:
+        setup()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        rows, nbytes = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "seconds": round(best, 4),
+        "rows": rows,
+        "mb": round(nbytes / 1024 / 1024, 2),
+        "rows_per_s": round(rows / best) if best and rows else None,
+        "mb_per_s": round(nbytes / 1024 / 1024 / best, 2) if best and nbytes else None,
+        "peak_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    # 返回比基线慢超过容差的用例名称
+    slower = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            result["vs_baseline"] = None
+            continue
+        ratio = result["seconds"] / base["seconds"] if base["seconds"] else 1.0
+        result["vs_baseline"] = f"{(ratio - 1) * 100:+.0f}%"
+        if ratio > 1 + tolerance:
+            slower.append(name)
+    return slower
+
+def print_table(results):
+    columns = ["seconds", "rows_per_s", "mb_per_s", "peak_mb", "vs_baseline"]
+    print(f"{'case':<18}" + "".join(f"{col:>14}" for col in columns))
+    for name, result in results.items():
+        print(f"{name:<18}" + "".join(f"{str(result.get(col, '') if result.get(col) is not None else '-'):>14}" for col in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument("--rows", type=int, default=100000, help="单个流速文件的行数")
+    parser.add_argument("--files", type=int, default=200, help="合并/转换用例的文件数")
+    parser.add_argument("--sheets", type=int, default=8, help="多sheet工作簿的sheet数")
+    parser.add_argument("--plot-groups", type=int, default=24, help="绘图用例绘制的分组数")
+    parser.add_argument("--repeat", type=int, default=3, help="计时运行次数, 取最短")
+    parser.add_argument("--only", nargs="*", help="只运行名称包含这些关键字的用例")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="合成数据目录")
+    parser.add_argument("--baseline", help="与该基线文件对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许比基线慢的比例")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线文件")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="streamlit_benchmark_")
+    os.environ["EXCEL_CACHE_DIR"] = os.path.join(work_dir, "excel_cache") # 不污染真实的parquet缓存
+    try:
+        paths = generate_data(args.data_dir, args.rows, args.files, args.sheets)
+        results = {}
+        for name, setup, func in build_cases(paths, work_dir, args.plot_groups):
+            if args.only and not any(keyword in name for keyword in args.only):
+                continue
+            print(f"运行 {name} ...", flush=True)
+            results[name] = run_case(setup, func, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    import pandas as pd
+    meta = {"rows": args.rows, "files": args.files, "sheets": args.sheets, "plot_groups": args.plot_groups,
+            "python": platform.python_version(), "pandas": pd.__version__, "machine": platform.machine(),
+            "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    slower = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        changed = [key for key in ("rows", "files", "sheets", "plot_groups") if baseline.get("meta", {}).get(key) != meta[key]]
+        if changed:
+            print(f"注意: 与基线的数据规模参数不同 ({', '.join(changed)}), 对比仅供参考")
+        slower = compare(results, baseline, args.tolerance)
+    print_table(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {args.save_baseline}")
+    if slower:
+        print(f"比基线慢超过 {args.tolerance:.0%}: {', '.join(slower)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""检查各页面的导入耗时, 并确认重量级依赖没有在导入阶段被加载。
+
+用法: python scripts/check_import_time.py [--budget 秒]
+超出预算或提前加载了重量级依赖时返回非零退出码, 可放在部署前的检查里。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRIES = ["app.py", os.path.join("pages", "可视化.py"), os.path.join("pages", "效率.py")]
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "openpyxl", "matplotlib", "chardet", "requests"]
+BUDGET_SECONDS = 0.3 # 不含streamlit本身的导入耗时
+
+# 在全新的子进程中执行, 避免模块缓存影响计时; run_name不是__main__, 页面的main()不会执行
+CHILD = """
+import json, runpy, sys, time
+sys.path.insert(0, {root!r})
+import streamlit
+start = time.perf_counter()
+runpy.run_path({entry!r}, run_name="__import_check__")
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(entry):
+    code = CHILD.format(root=ROOT, entry=os.path.join(ROOT, entry), heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="页面导入耗时检查")
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS, help="每个页面允许的导入耗时(秒)")
+    args = parser.parse_args()
+
+    failed = False
+    for entry in ENTRIES:
+        result = measure(entry)
+        over_budget = result["seconds"] > args.budget
+        failed = failed or over_budget or bool(result["loaded"])
+        status = "FAIL" if over_budget or result["loaded"] else "OK"
+        loaded = f"  提前加载: {', '.join(result['loaded'])}" if result["loaded"] else ""
+        print(f"[{status}] {entry}: {result['seconds'] * 1000:.0f} ms{loaded}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""批量导出流速分布图: 与"批量看流速分布"页面相同的筛选和绘图逻辑, 不需要浏览器, 可放在定时任务中运行。
+
+用法:
+    python scripts/export_charts.py config.json
+    python scripts/export_charts.py config.json --input a.csv b.xlsx --output charts/
+    python scripts/export_charts.py config.json --output charts.zip --workers 8
+
+输出为目录时图片逐张写入(多个输入文件时每个文件一个子目录); 输出以.zip结尾时边绘制边写入zip(不压缩, png本身已压缩)。
+图片名与页面打包下载一致: figure_0.png, figure_1.png, ...
+
+配置文件(JSON), 除y_columns外都可省略, 省略的列按页面的规则根据列名猜测; 完整示例:
+{
+    "input": ["D:/数据/0601.csv"],
+    "output": "charts",
+    "sheet": 0,
+    "group_column": "视频开始时间",
+    "date_format": null,
+    "x_column": "起点距",
+    "y_columns": ["流速1", "流速2"],
+    "line_columns": ["流速2"],
+    "water_column": "水位",
+    "filters": {
+        "time_range": ["2024-06-01 00:00:00", "2024-06-02 00:00:00"],
+        "time_of_day": ["22:00", "02:00"],
+        "water_range": [9.5, 10.5],
+        "confidence_columns": ["置信度1", "置信度2"],
+        "confidence_range": [0.2, 1.0],
+        "angle_column": "流向夹角",
+        "angle_range": [-90, 90]
+    },
+    "figsize": [6, 4],
+    "x_lim": null,
+    "y_lim": null,
+    "legend": true,
+    "grid": true,
+    "max_points": 0
+}
+
+字段说明:
+    input / output      输入文件列表和输出目录(或.zip), 也可以用 --input / --output 指定
+    sheet               Excel文件读取的sheet
+    date_format         分组列的时间格式, 为null时从样本推断
+    water_column        为空字符串时标题不显示水位
+    filters.time_of_day 只比较时间, 可跨午夜
+    filters.confidence_columns  与y_columns一一对应, 置信度不在confidence_range内的流速值不绘制
+    max_points          每条序列最多绘制点数, 0为不抽稀
+    超过100MB的csv按块读取, 要求同一时刻的行是连续的(按时间顺序记录)
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import time as dtime
+from zipfile import ZIP_STORED, ZipFile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.chunk_utils import is_large_csv, iter_complete_groups, read_csv_chunks
+from utils.common_utils import read_filepath
+from utils.datetime_utils import parse_datetime
+from utils.flow_utils import filter_flow_frame, flow_chart_tasks, guess_columns
+from utils.group_utils import GroupIndex
+from utils.lazy_utils import lazy_import
+from utils.plot_utils import render_charts
+
+pd = lazy_import("pandas")
+
+
+def load_config(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+@contextmanager
+def image_writer(output):
+    # 产出 write(名称, png字节), 每张图完成即落盘, 不在内存中积累
+    if output.lower().endswith(".zip"):
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with ZipFile(output, "w", ZIP_STORED) as zip_file:
+            yield zip_file.writestr
+    else:
+        def write(name, data):
+            path = os.path.join(output, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        yield write
+
+def build_filters(config, df, group_column, water_column, y_columns):
+    # 配置中的筛选条件 -> filter_flow_frame 的参数, 含义与页面上的各筛选项相同
+    filters = config.get("filters") or {}
+    row_filters, nan_filters = [], []
+    if filters.get("time_range"):
+        start, end = filters["time_range"]
+        row_filters.append((group_column, "range", pd.Timestamp(start), pd.Timestamp(end)))
+    if filters.get("time_of_day"):
+        start, end = filters["time_of_day"]
+        row_filters.append((group_column, "time_of_day", dtime.fromisoformat(start), dtime.fromisoformat(end)))
+    if filters.get("water_range"):
+        if not water_column:
+            raise ValueError("设置了water_range但没有水位列")
+        row_filters.append((water_column, "range", *filters["water_range"]))
+    if filters.get("confidence_columns"):
+        if len(filters["confidence_columns"]) != len(y_columns):
+            raise ValueError("confidence_columns的数量需与y_columns一致")
+        lower, upper = filters.get("confidence_range", [0.0, 1.0])
+        nan_filters = [(speed_col, conf_col, lower, upper) for speed_col, conf_col in zip(y_columns, filters["confidence_columns"])]
+    if filters.get("angle_range"):
+        angle_column = filters.get("angle_column") or guess_columns(df.columns)["angle"]
+        if not angle_column:
+            raise ValueError("设置了angle_range但没有流向夹角列")
+        row_filters.append((angle_column, "range", *filters["angle_range"]))
+    return row_filters, nan_filters
+
+def resolve_columns(config, columns): # 配置中的列名, 省略的按列名猜测; 返回 (分组列, X轴列, 水位列, Y轴列)
+    guessed = guess_columns(columns)
+    group_column = config.get("group_column") or guessed["group"] or columns[0]
+    x_column = config.get("x_column") or guessed["x"] or columns[0]
+    water_column = config.get("water_column", guessed["water"]) or None
+    y_columns = config["y_columns"]
+    missing = [col for col in [group_column, x_column, water_column, *y_columns] if col and col not in columns]
+    if missing:
+        raise ValueError(f"找不到列: {', '.join(missing)}")
+    return group_column, x_column, water_column, y_columns
+
+def prepare_frame(df, config, group_column, water_column, y_columns, date_format=None):
+    # 转换时间列并筛选; 返回 (筛选结果, 使用的时间格式)
+    parsed, info = parse_datetime(df[group_column], date_format)
+    if info["failed_rows"]:
+        raise ValueError(f"'{group_column}'列有 {info['failed_rows']} 行无法转换为日期时间, 请在配置中指定date_format")
+    df = df.copy(deep=False)
+    df[group_column] = parsed
+    row_filters, nan_filters = build_filters(config, df, group_column, water_column, y_columns)
+    return filter_flow_frame(df, row_filters, nan_filters), info["format"]
+
+def large_csv_frames(file_path, config, group_column, water_column, y_columns, columns):
+    # 超过LARGE_FILE_BYTES的csv按块读取, 只读需要的列, 逐块转换时间列和筛选; 第一块推断出的时间格式用于后续各块
+    date_format = config.get("date_format")
+    for chunk in read_csv_chunks(file_path, usecols=columns):
+        df, date_format = prepare_frame(chunk, config, group_column, water_column, y_columns, date_format)
+        yield df
+
+def export_file(file_path, config, write, prefix="", max_workers=None):
+    # 读取、转换时间列、筛选、分组并逐张写出图片, 返回图片数量
+    large = is_large_csv(file_path)
+    # 大csv只读表头, 数据按块读取, 内存占用与文件大小无关
+    df = read_filepath(file_path, nrows=0) if large else read_filepath(file_path, config.get("sheet", 0))
+    if df is None:
+        raise ValueError("不支持的文件格式")
+    group_column, x_column, water_column, y_columns = resolve_columns(config, df.columns)
+    columns = [x_column, *y_columns] + ([water_column] if water_column else [])
+    options = {
+        "figsize": tuple(config.get("figsize", (6, 4))),
+        "x_label": x_column,
+        "x_lim": tuple(config["x_lim"]) if config.get("x_lim") else None,
+        "y_lim": tuple(config["y_lim"]) if config.get("y_lim") else None,
+        "legend": config.get("legend", True),
+        "grid": config.get("grid", True),
+    }
+    chart_options = (x_column, y_columns, config.get("line_columns", []), water_column, config.get("max_points", 0))
+
+    if large:
+        # 筛选条件用到的列也要读取; 跨块的分组合并完整后再建索引, 各块的图连续编号
+        filters = config.get("filters") or {}
+        needed = {group_column, *columns, *(filters.get("confidence_columns") or []),
+                  filters.get("angle_column") or guess_columns(df.columns)["angle"]}
+        usecols = [col for col in df.columns if col in needed]
+        frames = large_csv_frames(file_path, config, group_column, water_column, y_columns, usecols)
+        count = 0
+
+        def tasks():
+            nonlocal count
+            for part in iter_complete_groups(frames, group_column):
+                index = GroupIndex(part, group_column, columns)
+                count += len(index)
+                yield from flow_chart_tasks(index, *chart_options)
+    else:
+        df_filtered, _ = prepare_frame(df, config, group_column, water_column, y_columns, config.get("date_format"))
+        index = GroupIndex(df_filtered, group_column, columns)
+        count = len(index)
+
+        def tasks():
+            return flow_chart_tasks(index, *chart_options)
+
+    for i, png in render_charts(tasks(), options, max_workers):
+        write(f"{prefix}figure_{i}.png", png)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导出流速分布图")
+    parser.add_argument("config", help="JSON配置文件")
+    parser.add_argument("--input", nargs="*", help="输入文件, 覆盖配置中的input")
+    parser.add_argument("--output", help="输出目录或.zip文件, 覆盖配置中的output")
+    parser.add_argument("--workers", type=int, help="绘图进程数, 默认为CPU核数")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    inputs = args.input or config.get("input") or []
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    output = args.output or config.get("output") or "charts"
+    if not inputs:
+        parser.error("没有输入文件")
+    if not config.get("y_columns"):
+        parser.error("配置中缺少y_columns")
+
+    failed = 0
+    with image_writer(output) as write:
+        for file_path in inputs:
+            # 多个输入时按文件名分子目录, 避免图片重名
+            prefix = os.path.splitext(os.path.basename(file_path))[0] + "/" if len(inputs) > 1 else ""
+            start = time.perf_counter()
+            try:
+                count = export_file(file_path, config, write, prefix, args.workers)
+            except Exception as e:
+                failed += 1
+                print(f"[失败] {file_path}: {e}", file=sys.stderr)
+                continue
+            print(f"[完成] {file_path}: {count} 张图, {time.perf_counter() - start:.1f} 秒")
+    print(f"输出: {output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import glob
+import hashlib
+import os
+import tempfile
+
+from utils.lazy_utils import lazy_import
+
+pq = lazy_import("pyarrow.parquet")
+
+# 解析后的表格以parquet缓存到磁盘, 进程重启后再次打开同一文件只需读取列存数据
+CACHE_DIR = os.environ.get("EXCEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "streamlit_excel_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("EXCEL_CACHE_MAX_MB", 4096)) * 1024 * 1024
+
+
+def _hash(text):
+    return hashlib.sha1(str(text).encode("utf-8")).hexdigest()[:16]
+
+def file_fingerprint(file_path): # 路径 + 修改时间 + 大小, 任一变化即视为新文件
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+def cache_path(file_path, sheet=0):
+    path, mtime_ns, size = file_fingerprint(file_path)
+    # 文件名 = 路径哈希_版本哈希_sheet哈希, 便于按文件或按版本清除缓存
+    return os.path.join(CACHE_DIR, f"{_hash(path)}_{_hash((mtime_ns, size))}_{_hash(sheet)}.parquet")
+
+def read_cached(file_path, sheet=0):
+    path = cache_path(file_path, sheet)
+    if not os.path.exists(path):
+        return None
+    try:
+        return pq.read_table(path, memory_map=True).to_pandas()
+    except Exception: # 缓存文件损坏时当作未命中
+        _remove(path)
+        return None
+
+def write_cached(df, file_path, sheet=0):
+    path = cache_path(file_path, sheet)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # 同一文件的旧版本缓存已不可能命中, 直接删除
+    path_hash, version_hash, _ = os.path.basename(path).split("_")
+    for old_path in glob.glob(os.path.join(CACHE_DIR, f"{path_hash}_*.parquet")):
+        if os.path.basename(old_path).split("_")[1] != version_hash:
+            _remove(old_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path, engine="pyarrow")
+        os.replace(tmp_path, path) # 原子替换, 避免其他会话读到写了一半的文件
+    except Exception: # 列名非字符串、object列混合类型等无法转为parquet的表不缓存
+        _remove(tmp_path)
+        return False
+    prune_cache()
+    return True
+
+def invalidate_file(file_path): # 只清除该文件的缓存
+    path = os.path.abspath(file_path)
+    for cached in glob.glob(os.path.join(CACHE_DIR, f"{_hash(path)}_*.parquet")):
+        _remove(cached)
+
+def prune_cache(max_bytes=CACHE_MAX_BYTES): # 超出容量时按最近访问时间淘汰
+    entries = []
+    for cached in glob.glob(os.path.join(CACHE_DIR, "*.parquet")):
+        try:
+            stat = os.stat(cached)
+        except OSError:
+            continue
+        entries.append((stat.st_atime, stat.st_size, cached))
+    total = sum(size for _, size, _ in entries)
+    for _, size, cached in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(cached)
+        total -= size
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
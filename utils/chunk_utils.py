@@ -0,0 +1,97 @@
+import os
+
+from utils.datetime_utils import infer_datetime_format
+from utils.encoding_utils import SAMPLE_BYTES, detect_bytes_encoding, detect_file_encoding
+from utils.lazy_utils import lazy_import
+
+pd = lazy_import("pandas")
+
+CHUNK_ROWS = 200000 # 每块行数
+SAMPLE_ROWS = 10000 # 用于推断列类型的样本行数
+LARGE_FILE_BYTES = 100 * 1024 * 1024 # 超过该大小的csv按块读取, 不整表载入
+
+
+def is_large_csv(file_path, threshold=LARGE_FILE_BYTES):
+    return file_path.lower().endswith('.csv') and os.path.getsize(file_path) > threshold
+
+def _detect_encoding(file):
+    if isinstance(file, (str, os.PathLike)):
+        return detect_file_encoding(file)
+    sample = file.read(SAMPLE_BYTES)
+    file.seek(0)
+    return detect_bytes_encoding(sample, is_complete=len(sample) < SAMPLE_BYTES)
+
+def infer_csv_dtypes(file, usecols=None, encoding=None, sample_rows=SAMPLE_ROWS):
+    # 根据样本推断每列类型; 整数列用可空的Int64, 防止后续块出现空值时报错; 时间列返回 {列名: 格式}
+    # 第三个返回值表示样本是否已覆盖整个文件, 只有覆盖整个文件时推断出的类型才一定适用于所有行
+    encoding = encoding or _detect_encoding(file)
+    sample = pd.read_csv(file, encoding=encoding, usecols=usecols, nrows=sample_rows)
+    if not isinstance(file, (str, os.PathLike)):
+        file.seek(0)
+
+    dtype = {}
+    parse_dates = {}
+    for col in sample.columns:
+        series = sample[col]
+        if pd.api.types.is_bool_dtype(series):
+            dtype[col] = 'boolean'
+        elif pd.api.types.is_integer_dtype(series):
+            dtype[col] = 'Int64'
+        elif pd.api.types.is_float_dtype(series):
+            dtype[col] = 'float64'
+        elif series.notna().any():
+            date_format = infer_datetime_format(series)
+            if date_format and pd.to_datetime(series, format=date_format, errors='coerce').notna().sum() == series.notna().sum():
+                parse_dates[col] = date_format
+    return dtype, parse_dates, len(sample) < sample_rows
+
+def cast_chunks(chunks, dtype):
+    # 逐块按样本推断的类型转换; 某列在这一块里转换失败(如整数列后面出现1.5, 样本中全空的列后面出现文字)时,
+    # 该块的这一列保留pandas自己推断的类型(float64/object), 不让整个读取报错
+    for chunk in chunks:
+        for col, col_dtype in dtype.items():
+            if col in chunk.columns and chunk[col].dtype != col_dtype:
+                try:
+                    chunk[col] = chunk[col].astype(col_dtype)
+                except (TypeError, ValueError):
+                    pass
+        yield chunk
+
+def read_csv_chunks(file, chunksize=CHUNK_ROWS, usecols=None, dtype=None, encoding=None):
+    # 返回按块读取的迭代器; usecols只读取需要的列
+    encoding = encoding or _detect_encoding(file)
+    inferred, parse_dates, complete = infer_csv_dtypes(file, usecols=usecols, encoding=encoding)
+    parse_dates = {col: date_format for col, date_format in parse_dates.items() if col not in (dtype or {})}
+    # 每块按样本推断出的格式解析时间列, 不逐个猜格式; 解析不了的值所在的块该列保留为文本
+    options = dict(encoding=encoding, usecols=usecols, parse_dates=list(parse_dates), date_format=parse_dates, chunksize=chunksize)
+    if complete:
+        # 样本就是整个文件, 推断的类型对所有块都成立, 直接在读取时指定
+        inferred.update(dtype or {})
+        return pd.read_csv(file, dtype=inferred, **options)
+    # 样本之后的行可能不符合推断的类型, 调用方指定的类型仍在读取时强制, 推断的类型逐块尝试转换
+    inferred = {col: col_dtype for col, col_dtype in inferred.items() if col not in (dtype or {})}
+    return cast_chunks(pd.read_csv(file, dtype=dtype, **options), inferred)
+
+def iter_complete_groups(chunks, group_column):
+    # 分块数据按分组列切分, 依次产出只含完整分组的DataFrame: 每块最后一组可能延续到下一块, 留到下一块一起产出;
+    # 要求相同值的行是连续的(如按时间顺序记录的流速日志), 已产出的组在后面再次出现时报错, 不悄悄拆成两组
+    carry = None
+    seen = set()
+    for chunk in chunks:
+        if carry is not None and len(carry):
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        tail = (chunk[group_column] == chunk[group_column].iloc[-1]).to_numpy()
+        carry = chunk[tail]
+        if not tail.all():
+            yield _check_groups(chunk[~tail], group_column, seen)
+    if carry is not None and len(carry):
+        yield _check_groups(carry, group_column, seen)
+
+def _check_groups(df, group_column, seen):
+    keys = set(df[group_column].dropna().unique())
+    if keys & seen:
+        raise ValueError(f"'{group_column}'列相同的值不连续, 大文件需先按该列排序")
+    seen.update(keys)
+    return df
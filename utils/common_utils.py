@@ -1,12 +1,20 @@
 import json
 import os
-from io import BytesIO
-from zipfile import ZIP_DEFLATED, ZipFile
 
-import pandas as pd
 import streamlit as st
-from chardet import detect
-from chardet.universaldetector import UniversalDetector
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from utils.cache_utils import file_fingerprint, invalidate_file, read_cached, write_cached
+from utils.dataset_store import dataset_store, upload_digest
+from utils.dtype_utils import compact_frame, compact_summary
+from utils.encoding_utils import (SAMPLE_BYTES, decode_bytes, detect_bytes_encoding, detect_file_encoding,
+                                  fallback_encoding, remember_encoding)
+from utils.export_utils import (artifact_output, as_download_data, frame_digest, get_artifact, put_artifact,
+                                spooled_output, write_xlsx_stream)
+from utils.lazy_utils import lazy_import
+from utils.perf_utils import current_run, get_records, instrument, records_jsonl, timed
+
+pd = lazy_import("pandas")
 
 
 def trim_quotes(path): # 去除路径两端的引号
@@ -17,21 +25,44 @@ def trim_quotes(path): # 去除路径两端的引号
 def is_gibberish(text): # 检测是否包含非ASCII字符, 判断读取excel编码是否对
     return any(ord(char) > 127 for char in text)
 
-@st.cache_data
-def read_excel_file(file, **kwargs):
+def _session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+def load_dataset(key, loader, label=None, slot="default"):
+    # 从进程共享的数据集仓库取只读DataFrame, 多个会话打开同一份数据时不重复解析也不拷贝
+    # 每个会话的每个slot只租用一个数据集, 换数据集时释放旧的, 便于仓库淘汰
+    owner = _session_id()
+    leases = st.session_state.setdefault("_dataset_leases", {}) if owner else {}
+    if leases.get(slot) not in (None, key):
+        dataset_store.release(leases[slot], owner)
+    leases[slot] = key
+    return dataset_store.get_or_load(key, loader, owner, label)
+
+def upload_key(file, **kwargs): # 上传文件按内容标识, 与哪个会话上传无关
+    return ("upload", file.name, upload_digest(file), tuple(sorted(kwargs.items())))
+
+def read_excel_file(file, compact=False, **kwargs): # compact为True时加载后转为紧凑类型, 见dtype_utils
+    def loader():
+        df = _read_excel_file(file, **kwargs)
+        return compact_frame(df) if compact and df is not None else df
+    return load_dataset(upload_key(file, compact=compact, **kwargs), loader, label=file.name, slot="upload")
+
+@instrument("读取上传文件", bytes_in=lambda file, **kwargs: getattr(file, "size", None))
+def _read_excel_file(file, **kwargs):
     try:
         file_extension = file.name.split('.')[-1]
         if file_extension == 'csv':
-            detector = UniversalDetector()
-            for line in file:
-                detector.feed(line)
-                if detector.done:
-                    break
-            detector.close()
-            encoding = detector.result['encoding']
+            sample = file.read(SAMPLE_BYTES)
+            encoding = detect_bytes_encoding(sample, is_complete=len(sample) < SAMPLE_BYTES)
             file.seek(0)
-            df = pd.read_csv(file, encoding=encoding, **kwargs)
+            try:
+                df = pd.read_csv(file, encoding=encoding, **kwargs)
+            except UnicodeDecodeError: # 样本之后才出现的异常字节, 与read_csv_path一样换用兜底编码重读一次
+                file.seek(0)
+                df = pd.read_csv(file, encoding=fallback_encoding(encoding), **kwargs)
         elif file_extension in ['xlsx', 'xls']:
+            file.seek(0)
             df = pd.read_excel(file, **kwargs)
         else:
             st.warning(f"不支持的文件格式: {file.name}")
@@ -42,75 +73,80 @@ def read_excel_file(file, **kwargs):
     except Exception as e:
         st.error(f"发生未知错误: {e}")
 
-@st.cache_data
-def read_excel_filepath(file_path, n=0):
-    file_path = trim_quotes(file_path)
+def read_csv_path(file_path, **kwargs): # 自动识别编码读取csv, 不依赖streamlit, 子进程中也可使用
+    # 编码只根据文件开头的样本判断, 正常情况下只解析一次
+    encoding = detect_file_encoding(file_path)
     try:
-        file_extension = os.path.splitext(file_path)[1].lower()
-
-        if file_extension == '.csv':
-            with open(file_path, 'rb') as f:
-                raw = f.read(10000)
-                result = detect(raw)
-            detected_encoding = result['encoding']
-            # with open(file_path, 'rb') as f:  # 读取大型文件时候速度过慢且会出错，弃用
-            #     detector = UniversalDetector()
-            #     for line in f.readlines():
-            #         detector.feed(line)
-            #         if detector.done:            
-            #             break
-            #     detector.close()
-
-            # detected_encoding = detector.result['encoding']
-
-            # 尝试使用检测到的编码读取文件
-            try:
-                df = pd.read_csv(file_path, encoding = detected_encoding)
-                if not any(is_gibberish(col) for col in df.columns):
-                    return df
-            except UnicodeDecodeError:
-                pass
-            
-            # 如果检测到乱码，尝试使用其他常见编码
-            for encoding in ['ANSI', 'UTF-8', 'GBK', 'ISO-8859-1']:
-                try:
-                    df = pd.read_csv(file_path, encoding = encoding)
-                    return df
-                except UnicodeDecodeError:
-                    continue
-            
-            st.error("无法使用常见编码读取文件，可能需要手动指定正确的编码或者另存为xlsx")
-            
-        elif file_extension in ['.xlsx', '.xls']:
-            df = pd.read_excel(file_path, sheet_name = n)
-            return df
+        return pd.read_csv(file_path, encoding = encoding, **kwargs)
+    except UnicodeDecodeError:
+        # 样本之后才出现的异常字节, 换用兜底编码重读一次并记住
+        encoding = fallback_encoding(encoding)
+        df = pd.read_csv(file_path, encoding = encoding, **kwargs)
+        remember_encoding(file_path, encoding)
+        return df
+
+def read_filepath(file_path, n=0, **kwargs): # 按扩展名读取, 出错直接抛异常, 由调用方决定如何提示
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == '.csv':
+        return read_csv_path(file_path, **kwargs)
+    elif file_extension in ['.xlsx', '.xls']:
+        return pd.read_excel(file_path, sheet_name = n, **kwargs)
+    return None
+
+def read_filepath_cached(file_path, n=0): # 先查磁盘列存缓存, 未命中再解析并写入缓存
+    df = read_cached(file_path, n)
+    if df is None:
+        df = read_filepath(file_path, n)
+        if isinstance(df, pd.DataFrame):
+            write_cached(df, file_path, n)
+    return df
+
+@instrument("读取本地文件", bytes_in=lambda file_path, n: os.path.getsize(file_path))
+def _read_excel_filepath(file_path, n):
+    try:
+        return read_filepath_cached(file_path, n)
     except UnicodeDecodeError as e:
         st.error(f"解码错误: {e}. 尝试使用其他编码方式, 大概率加密问题。")
     except Exception as e:
         st.error(f"发生未知错误: {e}")
     return None
 
-def load_data(file_path, n = 0):
+def read_excel_filepath(file_path, n=0, compact=False):
+    file_path = trim_quotes(file_path)
+    try:
+        path, mtime_ns, size = file_fingerprint(file_path)
+    except OSError as e:
+        st.error(f"发生未知错误: {e}")
+        return None
+    # 修改时间和大小参与key, 文件变化后自动失效
+    key = ("path", path, mtime_ns, size, n, compact)
+
+    def loader(): # 磁盘缓存保存原始类型, 紧凑转换在载入内存时进行
+        df = _read_excel_filepath(file_path, n)
+        return compact_frame(df) if compact and df is not None else df
+    return load_dataset(key, loader, label=os.path.basename(path), slot=("path", path))
+
+def clear_excel_filepath(file_path, n=0): # 只清除该文件的内存和磁盘缓存, 不影响其他缓存对象
+    file_path = trim_quotes(file_path)
+    invalidate_file(file_path)
+    path = os.path.abspath(file_path)
+    dataset_store.invalidate(match=lambda key: key[0] == "path" and key[1] == path)
+
+def load_data(file_path, n = 0, compact=False):
     if st.button('重新加载Excel数据'):
-        st.cache_data.clear() # 清除缓存
-        df = read_excel_filepath(file_path, n) # 重新加载数据
+        clear_excel_filepath(file_path, n) # 清除该文件的缓存
+        df = read_excel_filepath(file_path, n, compact) # 重新加载数据
 
         st.success('数据已重新加载')
     else:
-        df = read_excel_filepath(file_path, n) # 正常加载数据
+        df = read_excel_filepath(file_path, n, compact) # 正常加载数据
     return df
 
 # @st.cache_data
 def read_json(uploaded_file):
     try:
         file_content = uploaded_file.read()
-        encoding = detect(file_content)['encoding']
-        
-        # 如果检测失败，默认使用 utf-8
-        if not encoding:
-            encoding = 'utf-8'
-
-        content = file_content.decode(encoding)
+        content = decode_bytes(file_content)
         data = json.loads(content)
         
         return data
@@ -128,13 +164,7 @@ def read_json_path(file_path):
     try:
         with open(file_path, 'rb') as file:
             file_content = file.read()
-            encoding = detect(file_content)['encoding']
-            
-            # 如果检测失败，默认使用 utf-8
-            if not encoding:
-                encoding = 'utf-8'
-
-            content = file_content.decode(encoding)
+            content = decode_bytes(file_content)
             data = json.loads(content)
             return data
     except:
@@ -143,50 +173,74 @@ def read_json_path(file_path):
 
 @st.experimental_fragment()
 def save_and_download_file(df, file_name="output_file.xlsx"):
-    output = BytesIO()
-    
-    # 只提供 Excel (.xlsx) 格式
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
-    output.seek(0) # 重新定位到文件开头，否则可能导致下载的文件大小为 0
-    # 提供下载链接
+    # 序列化结果按内容缓存, 只在用户点击生成时序列化一次, 之后的重跑直接复用
+    key = ("xlsx", frame_digest(df))
+    data = get_artifact(key)
+    if data is None and st.button("生成Excel(.xlsx)文件"):
+        with timed("导出Excel", rows=len(df)) as entry:
+            output = artifact_output(".xlsx")
+            # 只提供 Excel (.xlsx) 格式, 分块流式写入, 超过单表行数上限自动拆分sheet
+            write_xlsx_stream([df], df.columns, output)
+            entry["bytes_out"] = put_artifact(key, output)
+        data = get_artifact(key)
+    if data is not None:
+        with data:
+            download_excel_file(data, file_name)
+
+def download_excel_file(output, file_name="output_file.xlsx"): # output为已写好的xlsx文件对象或bytes, 不再经过DataFrame
     st.download_button(
         label="下载处理后的Excel(.xslx)文件",
-        data=output.getvalue(),
+        data=as_download_data(output),
         file_name=file_name,
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
-    
     st.success("点击按钮下载！")
 
 @st.experimental_fragment()
 def save_and_download_csv(df, file_name="output_file.csv"):
-    csv = df.to_csv(index=False)
-    st.download_button(
-        label="下载处理后的CSV文件",
-        data=csv,
-        file_name=file_name,
-        mime="text/csv",
-    )
-    st.success("点击按钮下载！")
+    key = ("csv", frame_digest(df))
+    csv = get_artifact(key)
+    if csv is None and st.button("生成CSV文件"):
+        with timed("导出CSV", rows=len(df)) as entry:
+            output = artifact_output(".csv")
+            df.to_csv(output, index=False, encoding="utf-8")
+            entry["bytes_out"] = put_artifact(key, output)
+        csv = get_artifact(key)
+    if csv is not None:
+        with csv:
+            st.download_button(
+                label="下载处理后的CSV文件",
+                data=csv,
+                file_name=file_name,
+                mime="text/csv",
+            )
+        st.success("点击按钮下载！")
 
-@st.experimental_fragment()  
-def save_and_download_images(image_buffers):
-    if not image_buffers:
+@st.experimental_fragment()
+def save_and_download_images(archive, file_name="figures.zip"):
+    # archive为绘图时边产生边写入的zip临时文件(png不再压缩), 这里只提供下载, 不在内存中重新打包
+    if archive is None:
         st.warning("没有可下载的图片")
         return
 
-    zip_buffer = BytesIO()
-    with ZipFile(zip_buffer, "a", ZIP_DEFLATED, False) as zip_file:
-        for i, img_buffer in enumerate(image_buffers):
-            zip_file.writestr(f"figure_{i}.png", img_buffer.getvalue())
-    
     st.download_button(
         label="下载所有图片",
-        data=zip_buffer.getvalue(),
-        file_name="figures.zip",
+        data=as_download_data(archive),
+        file_name=file_name,
         mime="application/zip"
     )
 
+PERF_COLUMNS = ["stage", "seconds", "rows", "bytes_in", "bytes_out"]
 
-
+def perf_panel(): # 侧边栏耗时面板, 放在页面脚本最后调用, 显示本次重跑各阶段的耗时
+    if not st.sidebar.checkbox("显示耗时面板", value=False, key="_perf_panel"):
+        return
+    records = get_records(current_run())
+    with st.sidebar.expander("本次重跑耗时", expanded=True):
+        if records:
+            table = pd.DataFrame(records)
+            st.dataframe(table[[col for col in PERF_COLUMNS + ["error"] if col in table.columns]], hide_index=True)
+            st.caption(f"合计 {table['seconds'].sum():.3f} 秒 (缓存命中的阶段不计时)")
+        else:
+            st.caption("本次重跑没有耗时记录")
+        st.download_button("导出全部记录(JSON lines)", records_jsonl(get_records()), "perf.jsonl", "application/x-ndjson")
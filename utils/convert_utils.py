@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+
+from utils.chunk_utils import is_large_csv, read_csv_chunks
+from utils.common_utils import read_csv_path
+from utils.export_utils import write_xlsx_stream
+
+MAX_TASKS_PER_CHILD = 50 # 工作进程处理一定数量的文件后重建, 避免长时间批处理内存碎片累积
+
+
+def pool_context(): # 与其他进程池一样用fork, 工作进程直接继承已导入的模块; 没有fork的平台(Windows)用默认的spawn
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+def excel_path_for(csv_path):
+    return csv_path.rsplit('.', 1)[0] + '.xlsx'
+
+def is_up_to_date(csv_path, excel_path): # 输出文件比csv新则无需重新转换
+    return os.path.exists(excel_path) and os.path.getmtime(excel_path) >= os.path.getmtime(csv_path)
+
+def _result(csv_path, status, rows=0, seconds=0.0, error=""):
+    return {"文件": os.path.basename(csv_path), "状态": status, "行数": rows, "耗时(秒)": round(seconds, 2), "错误": error}
+
+def _read_frames(csv_path): # 小文件整表读取; 大文件按块读取, 单个文件的内存占用有上限
+    if is_large_csv(csv_path):
+        return read_csv_chunks(csv_path)
+    return iter([read_csv_path(csv_path)])
+
+def convert_csv(csv_path, excel_path=None): # 子进程中执行
+    excel_path = excel_path or excel_path_for(csv_path)
+    start = time.perf_counter()
+    tmp_path = excel_path + ".tmp"
+    try:
+        frames = _read_frames(csv_path)
+        first = next(frames, None)
+        if first is None or first.empty:
+            return _result(csv_path, "跳过(空文件)", seconds=time.perf_counter() - start)
+        rows = write_xlsx_stream(chain([first], frames), first.columns, tmp_path)
+        os.replace(tmp_path, excel_path) # 写完再替换, 中途失败不会留下看似最新的半成品
+        return _result(csv_path, "已转换", rows, time.perf_counter() - start)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return _result(csv_path, "失败", seconds=time.perf_counter() - start, error=str(e))
+
+def convert_csv_files(csv_paths, force=False, max_workers=None):
+    # 按完成顺序产出每个文件的状态; force为False时跳过已是最新的输出
+    todo = []
+    for csv_path in csv_paths:
+        if not force and is_up_to_date(csv_path, excel_path_for(csv_path)):
+            yield _result(csv_path, "跳过(已是最新)")
+        else:
+            todo.append(csv_path)
+    if not todo:
+        return
+    workers = min(max_workers or os.cpu_count() or 1, len(todo))
+    # 不用max_tasks_per_child: 它会把启动方式改成spawn(每个新进程重新导入streamlit和pandas), 而且Python 3.11上
+    # 进程退出时还有排队的任务会卡住; 改为分批, 每批一个新的fork进程池, 每个进程最多处理约MAX_TASKS_PER_CHILD个文件
+    batch_size = workers * MAX_TASKS_PER_CHILD
+    for start in range(0, len(todo), batch_size):
+        with ProcessPoolExecutor(workers, mp_context=pool_context()) as pool:
+            futures = [pool.submit(convert_csv, csv_path) for csv_path in todo[start:start + batch_size]]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.lazy_utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+DATASET_STORE_MAX_BYTES = int(os.environ.get("DATASET_STORE_MAX_MB", 2048)) * 1024 * 1024
+LEASE_TTL = 30 * 60 # 会话超过这么久没有访问, 不再算作在用(会话关闭时没有回调)
+
+
+def freeze_frame(df):
+    # 底层数组设为只读, 共享的DataFrame被原地修改时直接报错, 而不是悄悄影响其他会话; 只是尽力而为的保护:
+    # pandas没有公开的只读接口(对列视图设只读不影响底层块), 这里依赖pandas 2.x的内部块结构, 版本不符或结构变化时跳过;
+    # 只覆盖numpy存储的列, 扩展类型的列(Int64、boolean、category、string[pyarrow])不受保护, 各页面仍须按只读约定使用共享数据
+    if not pd.__version__.startswith("2."):
+        return df
+    for block in getattr(getattr(df, "_mgr", None), "blocks", ()):
+        if isinstance(block.values, np.ndarray):
+            block.values.flags.writeable = False
+    return df
+
+def frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class DatasetStore:
+    # 进程内所有会话共享的数据集仓库: 同一份数据只保留一个只读DataFrame, 命中时不拷贝;
+    # 按会话租约计数, 超出内存预算时按LRU淘汰没有会话在用的数据集
+    def __init__(self, max_bytes=DATASET_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> {"df", "nbytes", "label", "loaded_at", "last_access", "leases": {owner: 时间}}
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+        self._listeners = {} # 名称 -> 回调(被移除的key列表), 页面据此清除引用了这些数据集的派生缓存
+
+    def on_remove(self, name, callback): # 同名回调只保留最后一次注册的, 页面脚本每次重跑重新注册不会累积
+        with self._lock:
+            self._listeners[name] = callback
+
+    def get(self, key, owner=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._touch(key, entry, owner)
+            return entry["df"]
+
+    def get_or_load(self, key, loader, owner=None, label=None):
+        df = self.get(key, owner)
+        if df is not None:
+            return df
+        # 同一数据集同时只有一个会话在解析, 其他会话等待后直接复用
+        with self._lock:
+            loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+        with loading_lock:
+            df = self.get(key, owner)
+            if df is None:
+                df = loader()
+                if df is not None:
+                    self.put(key, df, owner, label)
+        with self._lock:
+            self._loading_locks.pop(key, None)
+        return df
+
+    def put(self, key, df, owner=None, label=None):
+        freeze_frame(df)
+        entry = {"df": df, "nbytes": frame_nbytes(df), "label": label or str(key), "loaded_at": time.time(),
+                 "last_access": time.time(), "leases": {}}
+        with self._lock:
+            self._entries[key] = entry
+            self._touch(key, entry, owner)
+            removed = self._evict()
+        self._notify(removed)
+        return df
+
+    def release(self, key, owner):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["leases"].pop(owner, None)
+
+    def invalidate(self, key=None, match=None): # 按key或按条件清除, 都不传时清空
+        removed = []
+        with self._lock:
+            for k in list(self._entries):
+                if (key is None and match is None) or k == key or (match is not None and match(k)):
+                    del self._entries[k]
+                    removed.append(k)
+        self._notify(removed)
+
+    def refs(self, entry, now=None):
+        now = now or time.time()
+        return sum(1 for seen in entry["leases"].values() if now - seen < LEASE_TTL)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return [{"数据集": entry["label"], "行数": len(entry["df"]), "列数": entry["df"].shape[1],
+                     "内存(MB)": round(entry["nbytes"] / 1024 / 1024, 2), "在用会话": self.refs(entry, now),
+                     "最近访问(秒前)": int(now - entry["last_access"]), "key": k}
+                    for k, entry in reversed(self._entries.items())]
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(entry["nbytes"] for entry in self._entries.values())
+
+    def _touch(self, key, entry, owner):
+        entry["last_access"] = time.time()
+        if owner is not None:
+            entry["leases"][owner] = entry["last_access"]
+        self._entries.move_to_end(key)
+
+    def _notify(self, removed): # 在锁外调用, 回调中可以再访问仓库
+        if not removed:
+            return
+        with self._lock:
+            listeners = list(self._listeners.values())
+        for callback in listeners:
+            callback(removed)
+
+    def _evict(self): # 返回被淘汰的key
+        total = sum(entry["nbytes"] for entry in self._entries.values())
+        now = time.time()
+        removed = []
+        # 从最久未访问的开始淘汰, 正在被会话使用的跳过; 都在用时允许暂时超出预算
+        for k in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[k]
+            if self.refs(entry, now) == 0:
+                total -= entry["nbytes"]
+                del self._entries[k]
+                removed.append(k)
+        return removed
+
+
+dataset_store = DatasetStore()
+
+_upload_digests = OrderedDict() # 上传文件id -> 内容哈希, 同一次上传只计算一次
+_upload_digests_lock = threading.Lock()
+
+def upload_digest(file): # 不同会话上传同一个文件得到相同的哈希, 可以共享数据集
+    file_id = getattr(file, "file_id", None) # 没有上传id的文件对象(如BytesIO)每次都重新计算, 不能共用一个None键
+    if file_id is not None:
+        with _upload_digests_lock:
+            if file_id in _upload_digests:
+                return _upload_digests[file_id]
+    with file.getbuffer() as buffer:
+        digest = hashlib.sha1(buffer).hexdigest()
+    if file_id is None:
+        return digest
+    with _upload_digests_lock:
+        _upload_digests[file_id] = digest
+        while len(_upload_digests) > 256:
+            _upload_digests.popitem(last=False)
+    return digest
@@ -0,0 +1,79 @@
+import warnings
+
+from utils.lazy_utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+SAMPLE_SIZE = 1000 # 推断格式时最多使用的样本数, 在整列中均匀抽取
+MIN_MATCH_RATIO = 0.9 # 样本中至少这么多能按某个格式解析, 才采用该格式
+# 常见的时间格式, 按团队数据中出现的频率排列; 月/日/时不补零也能解析
+DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y/%m/%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M", "%Y/%m/%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y年%m月%d日 %H:%M:%S", "%Y年%m月%d日 %H时%M分%S秒", "%Y年%m月%d日 %H:%M", "%Y.%m.%d %H:%M:%S",
+    "%Y%m%d%H%M%S", "%Y%m%d %H:%M:%S", "%Y-%m-%d", "%Y/%m/%d", "%Y年%m月%d日", "%Y%m%d",
+    "%d/%m/%Y %H:%M:%S", "%m/%d/%Y %H:%M:%S", "%H:%M:%S",
+]
+
+
+def sample_values(series, sample_size=SAMPLE_SIZE): # 在整列中均匀抽样并去重, 不只看开头几行
+    values = series.dropna()
+    if values.empty:
+        return values
+    positions = np.unique(np.linspace(0, len(values) - 1, min(sample_size, len(values))).astype(int))
+    return pd.Series(values.iloc[positions].astype(str).str.strip().unique())
+
+def infer_datetime_format(series, sample_size=SAMPLE_SIZE):
+    # 用样本逐个尝试候选格式, 返回匹配比例最高的格式; 都达不到MIN_MATCH_RATIO时返回None
+    sample = sample_values(series, sample_size)
+    if sample.empty:
+        return None
+    best_format, best_ratio = None, 0.0
+    for date_format in DATETIME_FORMATS:
+        ratio = pd.to_datetime(sample, format=date_format, errors='coerce').notna().mean()
+        if ratio > best_ratio:
+            best_format, best_ratio = date_format, ratio
+            if ratio == 1.0:
+                break
+    return best_format if best_ratio >= MIN_MATCH_RATIO else None
+
+def parse_mixed(text): # 逐个解析, 带时区的值保留当地时间并去掉时区, 保证结果为统一的datetime64列
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        parsed = pd.to_datetime(text, format='mixed', errors='coerce')
+    if parsed.dtype == object:
+        parsed = pd.to_datetime(parsed.map(lambda v: v.replace(tzinfo=None) if hasattr(v, 'tzinfo') else v), errors='coerce')
+    elif getattr(parsed.dt, 'tz', None) is not None:
+        parsed = parsed.dt.tz_localize(None)
+    return parsed
+
+def parse_datetime(series, date_format=None):
+    # 返回 (解析后的列, 信息), 信息包括使用的格式、逐个解析的行数和无法解析的行数;
+    # 同一时刻通常对应很多行, 只解析去重后的值再按编码展开; 未指定格式时先从样本推断
+    info = {"format": date_format, "fallback_rows": 0, "failed_rows": 0}
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series, info
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return pd.to_datetime(series), info # 数值等类型沿用pandas默认转换
+
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    date_format = info["format"] = date_format or infer_datetime_format(text)
+    if date_format:
+        parsed = pd.to_datetime(text, format=date_format, errors='coerce')
+    else:
+        parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques)) # 每个去重值对应的行数
+    odd = parsed.isna().to_numpy()
+    if odd.any():
+        # 与推断格式不一致的少数值再逐个解析
+        parsed[odd] = parse_mixed(text[odd])
+        failed = parsed.isna().to_numpy()
+        info["fallback_rows"] = int(counts[odd & ~failed].sum())
+        info["failed_rows"] = int(counts[failed].sum())
+
+    values = parsed.to_numpy()[codes]
+    values[codes < 0] = np.datetime64('NaT') # 原本为空的行
+    return pd.Series(values, index=series.index, name=series.name), info
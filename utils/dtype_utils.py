@@ -0,0 +1,57 @@
+from utils.lazy_utils import lazy_import
+
+pd = lazy_import("pandas")
+
+CATEGORY_RATIO = 0.5 # 不同值数量不超过行数的这个比例时转为分类类型, 如站名、重复的时间字符串
+
+
+def arrow_strings_available():
+    try:
+        import pyarrow # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def compact_dtypes(df, category_ratio=CATEGORY_RATIO):
+    # 推断每列更省内存的类型: 整数按取值范围缩小, 浮点转float32(约7位有效数字, 流速/置信度足够),
+    # 重复较多的文本转分类, 其余文本转Arrow字符串; 返回 {列名: 类型}, 不需要转换的列不在其中
+    dtypes = {}
+    arrow_strings = arrow_strings_available()
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            dtype = pd.to_numeric(series, downcast='integer').dtype
+        elif pd.api.types.is_float_dtype(series) and series.dtype.itemsize > 4:
+            dtype = 'float32'
+        elif pd.api.types.is_object_dtype(series) and pd.api.types.infer_dtype(series, skipna=True) == 'string':
+            if series.nunique(dropna=True) <= max(len(series) * category_ratio, 1):
+                dtype = 'category'
+            elif arrow_strings:
+                dtype = 'string[pyarrow]'
+            else:
+                continue
+        else:
+            continue
+        if dtype != series.dtype:
+            dtypes[col] = dtype
+    return dtypes
+
+def compact_frame(df, category_ratio=CATEGORY_RATIO):
+    # 按compact_dtypes转换, 转换前后的内存(字节)记录在df.attrs["compact"]中, 供页面显示节省了多少内存
+    before = int(df.memory_usage(index=True, deep=True).sum())
+    dtypes = compact_dtypes(df, category_ratio)
+    if dtypes:
+        df = df.astype(dtypes)
+    after = int(df.memory_usage(index=True, deep=True).sum())
+    df.attrs["compact"] = {"before": before, "after": after, "columns": len(dtypes)}
+    return df
+
+def compact_summary(df): # 页面显示用的一句话, 未做紧凑转换时返回None
+    report = df.attrs.get("compact")
+    if not report:
+        return None
+    before, after = report["before"] / 1024 / 1024, report["after"] / 1024 / 1024
+    saved = 1 - after / before if before else 0
+    return f"紧凑类型已应用于 {report['columns']} 列, 内存 {before:.1f} MB → {after:.1f} MB (节省 {saved:.0%})"
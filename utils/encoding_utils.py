@@ -0,0 +1,71 @@
+import codecs
+import threading
+from collections import OrderedDict
+
+from utils.cache_utils import file_fingerprint
+
+SAMPLE_BYTES = 64 * 1024 # 编码检测最多读取的字节数, 与文件大小无关
+CACHE_SIZE = 1024
+# 团队数据基本是GBK/UTF-8, chardet对短的中文表头经常误判为单字节编码, 所以严格解码通过时优先GB18030(GBK的超集)
+CJK_ENCODINGS = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'gb18030': 'gb18030', 'big5': 'big5', 'euc-jp': 'euc-jp', 'shift_jis': 'shift_jis', 'euc-kr': 'euc-kr'}
+BOMS = [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+
+_encoding_cache = OrderedDict() # 文件指纹 -> 编码
+_encoding_lock = threading.Lock()
+
+
+def can_decode(sample, encoding, is_complete=True): # 严格解码样本; 样本被截断时允许末尾不完整的多字节字符
+    try:
+        codecs.getincrementaldecoder(encoding)(errors='strict').decode(sample, final=is_complete)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+def detect_bytes_encoding(sample, is_complete=True):
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    # 快速路径: 绝大多数文件是UTF-8(含纯ASCII), 严格解码通过即可, 不需要chardet
+    if can_decode(sample, 'utf-8', is_complete):
+        return 'utf-8'
+
+    from chardet import detect # 快速路径失败才需要chardet
+    guess = (detect(sample)['encoding'] or '').lower()
+    candidates = [CJK_ENCODINGS[guess]] if guess in CJK_ENCODINGS else []
+    candidates += ['gb18030', guess]
+    for encoding in candidates:
+        if encoding and can_decode(sample, encoding, is_complete):
+            return encoding
+    return 'latin-1' # 任意字节都能解码, 兜底
+
+def detect_file_encoding(file_path, sample_bytes=SAMPLE_BYTES): # 只读取文件开头的固定字节数, 结果按文件指纹缓存
+    fingerprint = file_fingerprint(file_path)
+    with _encoding_lock:
+        if fingerprint in _encoding_cache:
+            _encoding_cache.move_to_end(fingerprint)
+            return _encoding_cache[fingerprint]
+
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    encoding = detect_bytes_encoding(sample, is_complete=len(sample) < sample_bytes)
+    remember_encoding(file_path, encoding)
+    return encoding
+
+def remember_encoding(file_path, encoding):
+    fingerprint = file_fingerprint(file_path)
+    with _encoding_lock:
+        _encoding_cache[fingerprint] = encoding
+        _encoding_cache.move_to_end(fingerprint)
+        while len(_encoding_cache) > CACHE_SIZE:
+            _encoding_cache.popitem(last=False)
+
+def fallback_encoding(encoding): # 样本之后才出现无法解码的字节时, 只再尝试一次
+    return 'gb18030' if encoding in ('utf-8', 'utf-8-sig', 'ascii') else 'latin-1'
+
+def decode_bytes(data, sample_bytes=SAMPLE_BYTES):
+    sample = data[:sample_bytes]
+    encoding = detect_bytes_encoding(sample, is_complete=len(data) <= sample_bytes)
+    try:
+        return data.decode(encoding)
+    except UnicodeDecodeError:
+        return data.decode(fallback_encoding(encoding))
@@ -0,0 +1,132 @@
+import atexit
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+from utils.lazy_utils import lazy_import
+
+pd = lazy_import("pandas")
+
+CHUNK_ROWS = 50000 # 每次转换写入的行数, 控制单次转object的内存
+EXCEL_MAX_ROWS = 1048576 # Excel单个sheet的行数上限(含表头)
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get("EXPORT_CACHE_MAX_MB", 512)) * 1024 * 1024 # 磁盘临时文件的总大小上限
+
+_artifacts = OrderedDict() # (格式, 内容哈希) -> (临时文件路径, 大小), 进程内所有会话共享, 按LRU淘汰; 内容在磁盘上, 不占内存
+_artifacts_bytes = 0
+_artifacts_lock = threading.Lock()
+_orphans = [] # 淘汰时未能删除的临时文件
+
+
+def iter_frame_rows(df, chunk_size=CHUNK_ROWS): # 分块把DataFrame转为行, NaN/NaT转为None, openpyxl才能正确写入
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+def write_xlsx_stream(frames, columns, output, sheet_name="Sheet1", chunk_size=CHUNK_ROWS, max_rows=EXCEL_MAX_ROWS - 1):
+    # 使用openpyxl的write_only模式逐块写入, 内存占用与总行数无关
+    # frames 可以是生成器, 每个DataFrame按columns对齐(缺失列留空), 与pd.concat的列合并效果一致
+    # 超过Excel单表行数上限时自动续写到 Sheet1_2, Sheet1_3 ...
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    header = [str(col) for col in columns]
+    ws = None
+    sheet_rows = 0
+    rows = 0
+    for df in frames:
+        df = df.reindex(columns=columns)
+        for row in iter_frame_rows(df, chunk_size):
+            if ws is None or sheet_rows >= max_rows:
+                ws = _new_sheet(wb, header, sheet_name, len(wb.worksheets))
+                sheet_rows = 0
+            ws.append(row)
+            sheet_rows += 1
+        rows += len(df)
+    if ws is None: # 没有数据也输出表头
+        _new_sheet(wb, header, sheet_name, 0)
+    wb.save(output)
+    return rows
+
+def _new_sheet(wb, header, sheet_name, index):
+    ws = wb.create_sheet(sheet_name if index == 0 else f"{sheet_name}_{index + 1}")
+    ws.append(header)
+    return ws
+
+def spooled_output(max_size=SPOOL_MAX_BYTES): # 小文件留在内存, 超过max_size自动转存到磁盘临时文件
+    return tempfile.SpooledTemporaryFile(max_size=max_size)
+
+def union_columns(headers): # 按首次出现顺序合并多个表头
+    columns = []
+    seen = set()
+    for header in headers:
+        for col in header:
+            if col not in seen:
+                seen.add(col)
+                columns.append(col)
+    return pd.Index(columns)
+
+def as_download_data(f): # st.download_button只接受bytes/BytesIO/BufferedReader等, 临时文件只通过公开接口读出一次
+    if isinstance(f, (bytes, io.BytesIO, io.BufferedReader)):
+        return f
+    f.flush()
+    f.seek(0)
+    return f.read()
+
+def frame_digest(df): # DataFrame内容哈希, 内容相同的结果只序列化一次
+    h = hashlib.sha1()
+    h.update(repr(([str(col) for col in df.columns], [str(dtype) for dtype in df.dtypes])).encode("utf-8"))
+    try:
+        h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    except TypeError: # 含list等不可哈希的值
+        h.update(pickle.dumps(df))
+    return h.hexdigest()
+
+def artifact_output(suffix=""): # 导出结果直接写入磁盘临时文件, 写完交给put_artifact缓存
+    return tempfile.NamedTemporaryFile(prefix="export_", suffix=suffix, delete=False)
+
+def get_artifact(key): # 命中时返回新打开的只读文件对象, 各会话读取位置互不影响, 用完由调用方关闭
+    with _artifacts_lock:
+        entry = _artifacts.get(key)
+        if entry is None:
+            return None
+        _artifacts.move_to_end(key)
+        try:
+            return open(entry[0], "rb")
+        except OSError: # 临时文件被外部清理, 当作未命中
+            _pop_artifact(key)
+            return None
+
+def put_artifact(key, f, max_bytes=ARTIFACT_CACHE_MAX_BYTES): # f为artifact_output写好的文件, 关闭后只记录路径和大小
+    global _artifacts_bytes
+    size = f.seek(0, os.SEEK_END)
+    f.close()
+    with _artifacts_lock:
+        if key in _artifacts:
+            _pop_artifact(key)
+        _artifacts[key] = (f.name, size)
+        _artifacts_bytes += size
+        while _artifacts_bytes > max_bytes and len(_artifacts) > 1:
+            _pop_artifact(next(iter(_artifacts)))
+    return size
+
+def _pop_artifact(key): # 调用方持有_artifacts_lock
+    global _artifacts_bytes
+    path, size = _artifacts.pop(key)
+    _artifacts_bytes -= size
+    try:
+        os.remove(path)
+    except OSError: # Windows上其他会话正在读取时删除失败, 进程退出时再清理
+        _orphans.append(path)
+
+@atexit.register
+def _clear_artifacts():
+    for path in [path for path, _ in _artifacts.values()] + _orphans:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
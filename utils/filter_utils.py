@@ -0,0 +1,52 @@
+from utils.lazy_utils import lazy_import
+
+np = lazy_import("numpy")
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+
+
+def time_to_ns(t): # datetime.time -> 当天零点起的纳秒数
+    return (((t.hour * 60 + t.minute) * 60 + t.second) * 10**6 + t.microsecond) * 1000
+
+def time_of_day_ns(series): # 日期时间列 -> 每个值在当天的纳秒数, 整列一次计算
+    if series.dt.tz is not None:
+        series = series.dt.tz_localize(None) # 按当地时间比较
+    return series.to_numpy(dtype='datetime64[ns]').view('int64') % NS_PER_DAY
+
+def time_of_day_mask(series, start_time, end_time):
+    # 只比较一天中的时间, 日期不起作用; 开始时间大于结束时间时视为跨午夜
+    tod = time_of_day_ns(series)
+    start, end = time_to_ns(start_time), time_to_ns(end_time)
+    if start <= end:
+        mask = (tod >= start) & (tod <= end)
+    else:
+        mask = (tod >= start) | (tod <= end)
+    return mask & series.notna().to_numpy()
+
+def range_mask(series, lower, upper): # 闭区间筛选, 适用于数值和日期时间列
+    return ((series >= lower) & (series <= upper)).to_numpy()
+
+def column_mask(series, kind, lower, upper): # 各筛选阶段统一的入口, 便于按参数缓存
+    if kind == 'time_of_day':
+        mask = time_of_day_mask(series, lower, upper)
+    elif kind == 'outside':
+        mask = ~range_mask(series, lower, upper)
+    else:
+        mask = range_mask(series, lower, upper)
+    mask.flags.writeable = False # 缓存中的掩码共享使用, 设为只读
+    return mask
+
+def combine_masks(masks, length): # 多个行掩码取交集, 没有掩码时全部保留
+    mask = np.ones(length, dtype=bool)
+    for m in masks:
+        mask &= m
+    return mask
+
+def apply_filters(df, row_mask, nan_masks=()):
+    # row_mask 筛选行, nan_masks为[(列名, 掩码)], 掩码为True的值置为NaN; 不修改传入的df
+    df_filtered = df if row_mask.all() else df[row_mask]
+    if nan_masks:
+        df_filtered = df_filtered.copy(deep=False)
+        for column, mask in nan_masks:
+            df_filtered[column] = df_filtered[column].mask(mask[row_mask])
+    return df_filtered
@@ -0,0 +1,39 @@
+from utils.filter_utils import apply_filters, column_mask, combine_masks
+from utils.lod_utils import downsample_series
+
+# 流速分布图的筛选和绘图任务构造, "批量看流速分布"页面和命令行批量导出共用
+
+
+def guess_columns(columns): # 按列名猜测分组列/X轴列/水位列/流向夹角列, 没有时为None
+    def first(*keywords):
+        return next((col for col in columns if any(keyword in col for keyword in keywords)), None)
+    return {
+        'group': first('时间', '视频开始时间'),
+        'x': first('起点距', '序号'),
+        'water': first('水位'),
+        'angle': first('流向夹角'),
+    }
+
+def filter_flow_frame(df, row_filters=(), nan_filters=()):
+    # row_filters: [(列名, 类型, 下限, 上限)] 按行筛选, 类型同column_mask;
+    # nan_filters: [(流速列, 置信度列, 下限, 上限)] 置信度不在范围内的流速值置为NaN, 行保留
+    masks = [column_mask(df[column], kind, lower, upper) for column, kind, lower, upper in row_filters]
+    nan_masks = [(speed_col, column_mask(df[conf_col], 'outside', lower, upper)) for speed_col, conf_col, lower, upper in nan_filters]
+    return apply_filters(df, combine_masks(masks, len(df)), nan_masks)
+
+def chart_title(name, water_level=None):
+    if water_level is None:
+        return f"时间: {name}"
+    return f"时间: {name} 水位: {water_level:.2f}m"
+
+def flow_chart_tasks(index, x_column, y_columns, line_columns=(), water_column=None, max_points=0):
+    # 按分组索引为每个时刻产出绘图任务 (标题, [(列名, X轴数据, Y轴数据, 是否折线)]), 每条序列按max_points抽稀
+    water_levels = index.first(water_column) if water_column else None
+    for i, name in enumerate(index.keys):
+        x_values = index.values(x_column, i)
+        series = []
+        for column in y_columns:
+            is_line = column in line_columns
+            x, y = downsample_series(x_values, index.values(column, i), max_points, is_line)
+            series.append((column, x, y, is_line))
+        yield chart_title(name, water_levels[i] if water_column else None), series
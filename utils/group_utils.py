@@ -0,0 +1,45 @@
+from utils.lazy_utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+class GroupIndex:
+    # 按分组列排序后的紧凑索引: 各列为连续的numpy数组, 第i组是 [offsets[i], offsets[i+1]) 这一段,
+    # 取某组的数据只是切片(视图), 不像groupby那样为每组构造子DataFrame; 分组顺序与groupby(sort=True)一致, 空值不成组
+    def __init__(self, df, group_column, columns):
+        codes, keys = pd.factorize(df[group_column], sort=True)
+        valid = codes >= 0
+        if valid.all() and (len(codes) < 2 or (np.diff(codes) >= 0).all()):
+            order = None # 数据本来就按分组列有序(按时间记录的日志), 直接使用原数组
+        else:
+            order = np.argsort(codes, kind='stable')[np.count_nonzero(~valid):]
+        counts = np.bincount(codes[valid], minlength=len(keys))
+        self.keys = keys
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._columns = {}
+        for column in dict.fromkeys(columns):
+            values = df[column].to_numpy()
+            self._columns[column] = values if order is None else values[order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def bounds(self, i):
+        return self.offsets[i], self.offsets[i + 1]
+
+    def values(self, column, i): # 第i组该列的数据, 零拷贝切片
+        start, end = self.bounds(i)
+        return self._columns[column][start:end]
+
+    def first(self, column): # 每组第一个值, 如每个时刻的水位
+        return self._columns[column][self.offsets[:-1]]
+
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def reduce(self, column, ufunc): # 整列一次完成分组聚合, 如 reduce(col, np.maximum) 得到每组最大值
+        values = self._columns[column]
+        if len(self) == 0:
+            return values[:0]
+        return ufunc.reduceat(values, self.offsets[:-1])
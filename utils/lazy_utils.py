@@ -0,0 +1,18 @@
+import importlib
+
+
+class LazyModule: # 第一次访问属性时才真正导入模块, 用于推迟pandas/pyarrow/openpyxl等重量级依赖
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+def lazy_import(name):
+    return LazyModule(name)
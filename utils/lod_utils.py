@@ -0,0 +1,66 @@
+from utils.lazy_utils import lazy_import
+
+np = lazy_import("numpy")
+
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets 折线抽稀, 保留形状特征; x需升序
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    every = (n - 2) / (threshold - 2) # 首尾两点固定, 中间分为threshold-2个桶
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点作为三角形的第三个顶点
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[avg_start:avg_end].mean(), y[avg_start:avg_end].mean()
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+def grid_indices(x, y, max_points):
+    # 散点按二维网格分箱, 每个非空格子保留一个点, 密集区域不再重复绘制
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    bins = max(int(np.sqrt(max_points)), 1)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_bin = _bin(x, bins)
+    y_bin = _bin(y, bins)
+    _, indices = np.unique(x_bin * bins + y_bin, return_index=True)
+    if len(indices) > max_points:
+        indices = indices[np.linspace(0, len(indices) - 1, max_points).astype(int)]
+    return np.sort(indices)
+
+def _bin(values, bins):
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros(len(values), dtype=int)
+    return np.minimum(((values - low) / (high - low) * bins).astype(int), bins - 1)
+
+def downsample_series(x, y, max_points, is_line):
+    # 按点数预算抽稀单条序列, 只用于显示; max_points为0表示不抽稀
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if not max_points or len(x) <= max_points or x.dtype.kind not in 'iuf' or y.dtype.kind not in 'iuf':
+        return x, y
+    valid = np.flatnonzero(~(_isnan(x) | _isnan(y)))
+    if is_line:
+        order = valid[np.argsort(x[valid], kind='stable')]
+        keep = order[lttb_indices(x[order], y[order], max_points)]
+    else:
+        keep = valid[grid_indices(x[valid], y[valid], max_points)]
+    return x[keep], y[keep]
+
+def _isnan(values):
+    if values.dtype.kind == 'f':
+        return np.isnan(values)
+    return np.zeros(len(values), dtype=bool)
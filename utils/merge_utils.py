@@ -0,0 +1,72 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from utils.chunk_utils import is_large_csv, read_csv_chunks
+from utils.common_utils import read_filepath_cached
+from utils.export_utils import union_columns, write_xlsx_stream
+from utils.lazy_utils import lazy_import
+from utils.scan_utils import read_headers
+
+pd = lazy_import("pandas")
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+def list_excel_files(folder_path): # 排序保证合并顺序稳定
+    return [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path)) if f.endswith(EXCEL_EXTENSIONS)]
+
+def default_workers(max_workers=None):
+    return max_workers or os.cpu_count() or 1
+
+def read_file(file_path, n=0): # 子进程中执行, 先查磁盘列存缓存; 异常转为字符串返回, 避免整个合并中断
+    try:
+        return file_path, read_filepath_cached(file_path, n), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+def _submit(pool, file_path, n):
+    if is_large_csv(file_path): # 大csv不整表传回主进程, 由主进程按块读取
+        return None
+    return pool.submit(read_file, file_path, n)
+
+def iter_files(file_paths, max_workers=None, n=0):
+    # 进程池并行解析, 按文件顺序依次产出; 同时在途的任务数有上限, 已解析未写出的DataFrame不会无限堆积
+    # 大csv产出的是分块迭代器而不是DataFrame
+    max_workers = default_workers(max_workers)
+    paths = iter(file_paths)
+    with ProcessPoolExecutor(max_workers) as pool:
+        pending = deque((path, _submit(pool, path, n)) for path in islice(paths, max_workers * 2))
+        while pending:
+            file_path, future = pending.popleft()
+            for path in islice(paths, 1):
+                pending.append((path, _submit(pool, path, n)))
+            if future is None:
+                try:
+                    yield file_path, read_csv_chunks(file_path), None
+                except Exception as e:
+                    yield file_path, None, str(e)
+            else:
+                yield future.result()
+
+def merge_files(file_paths, output, columns=None, max_workers=None, on_error=None):
+    # 边解析边写入output, 返回写入的行数; columns为空时先读取表头求并集
+    if columns is None:
+        columns = union_columns(header for header in read_headers(file_paths) if header)
+
+    def frames():
+        for file_path, df, error in iter_files(file_paths, max_workers):
+            if df is None:
+                if on_error:
+                    on_error(file_path, error)
+            elif isinstance(df, pd.DataFrame):
+                yield df
+            else:
+                try:
+                    yield from df
+                except Exception as e: # 读到一半出错, 已写入的部分保留
+                    if on_error:
+                        on_error(file_path, str(e))
+
+    return write_xlsx_stream(frames(), columns, output)
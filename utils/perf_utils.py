@@ -0,0 +1,109 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+PERF_LOG_PATH = os.environ.get("PERF_LOG_PATH") # 设置后每条记录追加写入该JSON lines文件, 便于线上排查
+HISTORY_SIZE = 2000 # 每个会话在内存中保留的记录条数
+SESSION_TTL = 30 * 60 # 会话超过这么久没有新记录就丢弃其历史(会话关闭时没有回调), 与数据集仓库的LEASE_TTL一致
+
+_history = {} # 会话id -> deque(记录)
+_runs = {} # 会话id -> 当前重跑序号
+_seen = {} # 会话id -> 最近一次重跑或记录的时间
+_lock = threading.Lock()
+_log_lock = threading.Lock() # 只保护日志文件的追加写入, 磁盘I/O不占用_lock
+
+
+def _session_key():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "default"
+
+def _touch(key, now=None): # 调用方持有_lock; 更新会话的最近访问时间, 顺带清理长时间没有访问的会话
+    now = now or time.time()
+    _seen[key] = now
+    for session in [session for session, seen in _seen.items() if now - seen > SESSION_TTL]:
+        _seen.pop(session)
+        _history.pop(session, None)
+        _runs.pop(session, None)
+
+def begin_run(): # 页面脚本开头调用, 之后的记录归入新一次重跑
+    key = _session_key()
+    with _lock:
+        _touch(key)
+        _runs[key] = _runs.get(key, 0) + 1
+        return _runs[key]
+
+def _record(entry):
+    key = _session_key()
+    with _lock:
+        _touch(key)
+        entry["session"] = key
+        entry["run"] = _runs.get(key, 0)
+        _history.setdefault(key, deque(maxlen=HISTORY_SIZE)).append(entry)
+    if PERF_LOG_PATH:
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with _log_lock, open(PERF_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+@contextmanager
+def timed(stage, **fields):
+    # 记录一个阶段的耗时; 行数/输入输出字节数可以在进入时传入, 也可以在with块内写入返回的字典
+    entry = {"time": datetime.now().isoformat(timespec="seconds"), "stage": stage,
+             "rows": None, "bytes_in": None, "bytes_out": None}
+    entry.update(fields)
+    start = time.perf_counter()
+    try:
+        yield entry
+    except Exception as e:
+        entry["error"] = repr(e)
+        raise
+    finally:
+        entry["seconds"] = round(time.perf_counter() - start, 6)
+        _record(entry)
+
+def measure(result):
+    # 从返回值推断行数和输出字节数: DataFrame取行数, bytes取长度, (DataFrame, ...)取第一个元素
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, (bytes, bytearray)):
+        return {"bytes_out": len(result)}
+    if hasattr(result, "shape") and hasattr(result, "memory_usage"):
+        return {"rows": len(result)}
+    return {}
+
+def instrument(stage=None, bytes_in=None):
+    # 装饰器版本, bytes_in为可选函数, 根据调用参数计算输入字节数
+    def decorator(func):
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name, bytes_in=bytes_in(*args, **kwargs) if bytes_in else None) as entry:
+                result = func(*args, **kwargs)
+                for field, value in measure(result).items():
+                    if entry.get(field) is None:
+                        entry[field] = value
+            return result
+        return wrapper
+    return decorator
+
+def get_records(run=None): # 当前会话的记录, run为None时返回全部历史
+    key = _session_key()
+    with _lock:
+        records = list(_history.get(key, ()))
+    if run is not None:
+        records = [entry for entry in records if entry["run"] == run]
+    return records
+
+def current_run():
+    with _lock:
+        return _runs.get(_session_key(), 0)
+
+def records_jsonl(records):
+    return "".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in records).encode("utf-8")
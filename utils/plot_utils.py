@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+from itertools import islice
+
+_figures = {} # 每个工作进程按图幅缓存一个figure/axes, 重复使用
+
+
+def setup_matplotlib(backend=None):
+    import matplotlib # 只在绘图进程中导入
+    if backend:
+        matplotlib.use(backend)
+    import matplotlib.pyplot as plt
+    plt.rcParams['font.sans-serif']=['SimHei'] # 用黑体显示中文
+    plt.rcParams['axes.unicode_minus']=False # 正常显示负号
+
+def init_worker(): # 子进程只需要栅格化, 使用无界面的Agg后端
+    setup_matplotlib('Agg')
+
+def draw_chart(ax, task, options):
+    # task: (标题, [(列名, X轴数据, Y轴数据, 是否折线), ...]), 抽稀后每条序列的X轴数据可能不同
+    title, series = task
+    for column, x, y, is_line in series:
+        if is_line:
+            ax.plot(x, y, label=column)
+        else:
+            ax.scatter(x, y, label=column)
+    ax.set_title(title)
+    ax.set_xlabel(options['x_label'])
+    ax.set_ylabel(options.get('y_label', "流速"))
+    if options.get('x_lim'):
+        ax.set_xlim(*options['x_lim'])
+    if options.get('y_lim'):
+        ax.set_ylim(*options['y_lim'])
+    if options.get('legend', True):
+        ax.legend()
+    if options.get('grid', True):
+        ax.grid(True)
+
+def _get_axes(figsize):
+    import matplotlib.pyplot as plt
+    if figsize not in _figures:
+        _figures[figsize] = plt.subplots(figsize=figsize)
+    fig, ax = _figures[figsize]
+    ax.clear()
+    return fig, ax
+
+def render_chart(task, options): # 只栅格化一次, 返回png字节
+    fig, ax = _get_axes(tuple(options['figsize']))
+    draw_chart(ax, task, options)
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+def render_charts(tasks, options, max_workers=None):
+    # 在进程池中并行绘制, 按完成顺序产出 (序号, png字节); 在途任务数有上限, 避免一次性把所有分组数据发给子进程
+    max_workers = max_workers or os.cpu_count() or 1
+    tasks = iter(enumerate(tasks))
+    with ProcessPoolExecutor(max_workers, initializer=init_worker) as pool:
+        pending = {pool.submit(render_chart, task, options): i for i, task in islice(tasks, max_workers * 2)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                for j, task in islice(tasks, 1):
+                    pending[pool.submit(render_chart, task, options)] = j
+                yield i, future.result()
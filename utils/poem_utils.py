@@ -0,0 +1,55 @@
+import os
+import threading
+import time
+
+POEM_URL = os.environ.get("DAILY_POEM_URL", "https://v1.jinrishici.com/all.json") # 可指向本地桩服务测试
+# POEM_URL = 'https://v1.hitokoto.cn/?c=i'
+FALLBACK_SENTENCE = "「月落乌啼霜满天，江枫渔火对愁眠」"
+POEM_TTL = 24 * 60 * 60 # 一天取一次就够了
+RETRY_INTERVAL = 10 * 60 # 失败后隔一段时间再试, 离线环境不会每次刷新都去请求
+TIMEOUT = (2, 3) # 连接/读取超时(秒)
+
+_session = None
+_state = {"sentence": FALLBACK_SENTENCE, "expires_at": 0.0, "refreshing": False}
+_lock = threading.Lock()
+
+
+def get_session(): # 复用连接池, 不每次新建TCP/TLS连接
+    global _session
+    if _session is None:
+        import requests # 在后台线程中才导入, 不拖慢首页
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_maxsize=2, max_retries=0))
+        session.mount("http://", HTTPAdapter(pool_maxsize=2, max_retries=0))
+        _session = session
+    return _session
+
+def fetch_daily_sentence(url=POEM_URL, timeout=TIMEOUT): # 实际请求, 失败时抛出异常
+    response = get_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    return f"「{data['content']}」 —— {data['author']}"
+
+def refresh_sentence(url=POEM_URL):
+    sentence = None
+    expires_at = time.time() + RETRY_INTERVAL
+    try:
+        sentence = fetch_daily_sentence(url)
+        expires_at = time.time() + POEM_TTL
+    except Exception: # 任何失败(网络、返回格式、依赖缺失)都只是继续用兜底诗词
+        pass
+    finally: # 无论如何都要清除刷新中标记, 否则再也不会重新请求
+        with _lock:
+            if sentence:
+                _state["sentence"] = sentence
+            _state["expires_at"] = expires_at
+            _state["refreshing"] = False
+
+def get_daily_sentence(url=POEM_URL):
+    # 不阻塞页面渲染: 立即返回缓存(或兜底)诗词, 过期时在后台线程刷新, 下次渲染生效
+    with _lock:
+        if time.time() >= _state["expires_at"] and not _state["refreshing"]:
+            _state["refreshing"] = True
+            threading.Thread(target=refresh_sentence, args=(url,), daemon=True).start()
+        return _state["sentence"]
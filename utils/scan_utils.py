@@ -0,0 +1,92 @@
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+
+from utils.common_utils import read_filepath
+from utils.encoding_utils import detect_file_encoding
+
+SCAN_WORKERS = 8 # 预检只读表头和前几行, 主要是等待I/O, 用线程即可; 网络共享盘上并发太多反而更慢
+PREVIEW_ROWS = 5
+
+
+def scan_folder(folder_path, extensions):
+    # 只用scandir取目录项的元数据(名称/大小/修改时间), 不打开文件; 按文件名排序, 与合并顺序一致
+    entries = []
+    with os.scandir(folder_path) as it:
+        for entry in it:
+            if entry.name.endswith(extensions) and entry.is_file():
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+    return sorted(entries)
+
+def preview_file(file_path, rows=PREVIEW_ROWS): # 只读表头和前几行, 返回 (列名元组, 前几行, 编码, 错误)
+    try:
+        encoding = detect_file_encoding(file_path) if file_path.lower().endswith('.csv') else None
+        df = read_filepath(file_path, nrows=rows)
+        if df is None:
+            return None, None, encoding, "不支持的文件格式"
+        return tuple(df.columns), df, encoding, None
+    except Exception as e:
+        return None, None, None, str(e)
+
+def iter_previews(file_paths, max_workers=SCAN_WORKERS, rows=PREVIEW_ROWS):
+    # 线程池并发预读, 按完成顺序产出 (序号, 预读结果); 在途任务数有上限
+    tasks = iter(enumerate(file_paths))
+    with ThreadPoolExecutor(max_workers) as pool:
+        pending = {pool.submit(preview_file, path, rows): i for i, path in islice(tasks, max_workers * 2)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                for j, path in islice(tasks, 1):
+                    pending[pool.submit(preview_file, path, rows)] = j
+                yield i, future.result()
+
+def read_headers(file_paths, max_workers=SCAN_WORKERS): # 并发只读表头, 按文件顺序返回, 读取失败的为None
+    headers = [None] * len(file_paths)
+    for i, (header, _, _, _) in iter_previews(file_paths, max_workers, rows=1):
+        headers[i] = header
+    return headers
+
+def column_kinds(df): # 根据前几行粗略判断每列类型, 用于预检表中的结构说明
+    kinds = []
+    for col in df.columns:
+        dtype = df[col].dtype
+        if dtype.kind in 'iuf':
+            kind = '数值'
+        elif dtype.kind == 'M':
+            kind = '时间'
+        elif dtype.kind == 'b':
+            kind = '布尔'
+        else:
+            kind = '文本'
+        kinds.append(f"{col}:{kind}")
+    return ", ".join(kinds)
+
+def preflight(entries, max_workers=SCAN_WORKERS, rows=PREVIEW_ROWS, on_progress=None):
+    # entries为scan_folder的结果; 返回 (每个文件一行的汇总表, 各文件表头)
+    # 表头相同的文件编为同一组, 文件最多的组为1, 便于一眼看出哪些文件表头不一致
+    summary = [None] * len(entries)
+    headers = [None] * len(entries)
+    for done, (i, (header, df, encoding, error)) in enumerate(iter_previews([path for path, _, _ in entries], max_workers, rows), 1):
+        path, size, mtime_ns = entries[i]
+        headers[i] = header
+        summary[i] = {
+            "文件": os.path.basename(path),
+            "大小(KB)": round(size / 1024, 1),
+            "修改时间": datetime.fromtimestamp(mtime_ns / 1e9).strftime("%Y-%m-%d %H:%M:%S"),
+            "编码": encoding or "",
+            "列数": len(header) if header else 0,
+            "表头组": 0,
+            "结构": column_kinds(df) if df is not None else "",
+            "错误": error or "",
+        }
+        if on_progress:
+            on_progress(done, len(entries))
+
+    groups = {header: g for g, (header, _) in enumerate(Counter(h for h in headers if h).most_common(), 1)}
+    for row, header in zip(summary, headers):
+        row["表头组"] = groups.get(header, 0)
+    return summary, headers
@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.export_utils import write_xlsx_stream
+from utils.lazy_utils import lazy_import
+
+pd = lazy_import("pandas")
+
+
+def read_sheet_names(file_path): # 只读取workbook.xml, 不解析任何sheet的数据
+    if file_path.lower().endswith('.xls'):
+        return pd.ExcelFile(file_path).sheet_names
+    from openpyxl import load_workbook
+    wb = load_workbook(file_path, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+def _partition(items, parts): # 轮流分配, 让每个进程的sheet数量大致相同
+    return [items[i::parts] for i in range(parts) if items[i::parts]]
+
+def _read_sheet_group(file_path, sheet_names): # 每个进程只打开一次工作簿, 读取分配到的所有sheet
+    return pd.read_excel(file_path, sheet_name=sheet_names)
+
+def _split_sheet_group(file_path, sheet_names, output_dir):
+    outputs = []
+    for sheet, df in _read_sheet_group(file_path, sheet_names).items():
+        output_file = os.path.join(output_dir, f"{sheet}.xlsx")
+        write_xlsx_stream([df], df.columns, output_file)
+        outputs.append((sheet, output_file))
+    return outputs
+
+def _workers(sheet_names, max_workers):
+    return max(min(max_workers or os.cpu_count() or 1, len(sheet_names)), 1)
+
+def read_sheets(file_path, sheet_names=None, max_workers=None):
+    # 返回 {sheet名: DataFrame}, 顺序与工作簿一致; sheet较多时分组到多个进程并行解析
+    sheet_names = list(sheet_names or read_sheet_names(file_path))
+    workers = _workers(sheet_names, max_workers)
+    if workers == 1:
+        return _read_sheet_group(file_path, sheet_names)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_read_sheet_group, file_path, group) for group in _partition(sheet_names, workers)]
+        sheets = {}
+        for future in futures:
+            sheets.update(future.result())
+    return {sheet: sheets[sheet] for sheet in sheet_names}
+
+def split_sheets(file_path, output_dir, sheet_names=None, max_workers=None):
+    # 各进程读取自己负责的sheet并直接写出文件, DataFrame不需要传回主进程; 按完成顺序产出 (sheet名, 输出路径)
+    sheet_names = list(sheet_names or read_sheet_names(file_path))
+    workers = _workers(sheet_names, max_workers)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_split_sheet_group, file_path, group, output_dir) for group in _partition(sheet_names, workers)]
+        for future in as_completed(futures):
+            yield from future.result()
@@ -0,0 +1,62 @@
+from utils.lazy_utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# 统计量 -> 输出列名中的标签; 均使用pandas groupby的向量化实现, 不逐组循环
+STAT_LABELS = {"count": "有效数", "mean": "均值", "std": "标准差", "min": "最小值", "max": "最大值"}
+DEFAULT_STATS = ("count", "mean", "std", "min", "max")
+
+
+def bin_column(series, mode='value', param=None):
+    # 分组维度: 'value' 按原值; 'width' 按固定宽度分箱, 键为箱的起点;
+    # 'bins' 等宽分为param段; 'quantile' 按分位数等频分为param段(如水位分带), 后两种键为区间
+    if mode == 'width':
+        return (np.floor(series / param) * param).rename(f"{series.name}分箱")
+    if mode == 'bins':
+        return pd.cut(series, int(param)).rename(f"{series.name}区间")
+    if mode == 'quantile':
+        return pd.qcut(series, int(param), duplicates='drop').rename(f"{series.name}区间")
+    return series
+
+def group_codes(keys):
+    # 多个分组维度合成一个整数编码, pandas对单个整数键分组最快; 任一维度为空值的行不参与统计
+    factorized = [pd.factorize(key, sort=True) for key in keys]
+    codes = [codes for codes, _ in factorized]
+    valid = np.logical_and.reduce([c >= 0 for c in codes])
+    if not valid.all():
+        codes = [c[valid] for c in codes]
+    shape = [max(len(uniques), 1) for _, uniques in factorized]
+    return np.ravel_multi_index(codes, shape), valid, shape, [uniques for _, uniques in factorized]
+
+def aggregate(df, value_columns, by=(), quantiles=(), stats=DEFAULT_STATS):
+    # 按by中的各维度 [(列名, 方式, 参数)] 分组, 对value_columns计算统计量和分位数(百分数, 如50),
+    # 每组一行; 行数为组内行数, 有效数为非空值个数(置信度筛选置为NaN的值不计入); by为空时统计全部数据
+    keys = [bin_column(df[column], mode, param) for column, mode, param in by]
+    if not keys:
+        keys = [pd.Series("全部", index=df.index, name="分组")]
+    codes, valid, shape, uniques = group_codes(keys)
+    values = df[list(value_columns)]
+    if not valid.all():
+        values = values[valid]
+    grouped = values.groupby(codes, sort=True)
+
+    parts = [grouped.size().rename("行数")]
+    basic = grouped.agg(list(stats))
+    basic.columns = [f"{column} {STAT_LABELS.get(stat, stat)}" for column, stat in basic.columns]
+    parts.append(basic)
+    if quantiles and len(values):
+        quantile = grouped.quantile([q / 100 for q in quantiles]).unstack(-1)
+        quantile.columns = [f"{column} P{q * 100:g}" for column, q in quantile.columns]
+        parts.append(quantile)
+    result = pd.concat(parts, axis=1)
+
+    # 整数编码还原为各维度的取值, 区间转为文字便于显示和导出Excel
+    key_codes = np.unravel_index(result.index.to_numpy(), shape)
+    key_columns = {}
+    for key, key_uniques, key_code in zip(keys, uniques, key_codes):
+        column = pd.Series(key_uniques.take(key_code))
+        key_columns[key.name] = column.astype(str) if isinstance(column.dtype, pd.CategoricalDtype) else column
+    # 列按 分组维度, 行数, 各数值列的统计量+分位数 排列
+    ordered = ["行数"] + [col for column in value_columns for col in result.columns if col.startswith(f"{column} ")]
+    return pd.concat([pd.DataFrame(key_columns), result[ordered].reset_index(drop=True)], axis=1)